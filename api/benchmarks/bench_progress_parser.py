@@ -0,0 +1,158 @@
+"""Parser CPU per job: legacy regex scraping vs. JSON progress events.
+
+Replays a synthetic yt-dlp log for one playlist job through both parsers and
+reports process CPU time. Run from the api directory:
+
+    python benchmarks/bench_progress_parser.py [--tracks 20] [--ticks 400]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="p2a-bench-"))
+os.environ.setdefault("JOB_STORE", "memory")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+main.logger.setLevel(logging.WARNING)
+
+
+def legacy_lines(tracks: int, ticks: int):
+    yield f"[youtube:tab] Playlist Bench: {tracks} videos"
+    for i in range(1, tracks + 1):
+        yield f"[download] Downloading item {i} of {tracks}"
+        yield f"[youtube] abc{i:08d}: Downloading webpage"
+        yield f"[download] Destination: /data/jobs/x/{i:02d} - Track {i}.webm"
+        for t in range(ticks):
+            pct = 100.0 * (t + 1) / ticks
+            yield f"[download]  {pct:5.1f}% of    4.20MiB at    1.21MiB/s ETA 00:03"
+        yield "[download] 100% of    4.20MiB in 00:00:03 at 1.21MiB/s"
+        yield f"[ExtractAudio] Destination: /data/jobs/x/{i:02d} - Track {i}.mp3"
+        yield f"Deleting original file /data/jobs/x/{i:02d} - Track {i}.webm"
+
+
+def json_lines(tracks: int, ticks: int):
+    marker = main.PROGRESS_MARKER
+    for i in range(1, tracks + 1):
+        title = f"Track {i}"
+        yield marker + json.dumps({"event": "start", "index": i, "n_entries": tracks, "id": f"abc{i:08d}", "title": title})
+        for t in range(ticks):
+            done = int(4_404_019 * (t + 1) / ticks)
+            tick = {
+                "event": "progress",
+                "downloaded_bytes": done,
+                "total_bytes": 4_404_019,
+                "total_bytes_estimate": None,
+                "speed": 1_268_000.0,
+                "eta": 3,
+                "index": i,
+                "n_entries": tracks,
+                "title": title,
+            }
+            yield marker + json.dumps(tick, separators=(",", ":"))
+        yield marker + json.dumps(
+            {"event": "finished", "index": i, "id": f"abc{i:08d}", "title": title,
+             "filepath": f"/data/jobs/x/{i:02d} - {title}.mp3"}
+        )
+
+
+def legacy_parse(job_id: str, lines):
+    """The stdout loop run_download_with_progress used before JSON events"""
+    store = defaultdict(dict)
+    lock = threading.Lock()
+    log = main.logger
+    store[job_id] = {"current": 0, "total": 1, "status": "starting", "current_title": None}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        log.debug(f"yt-dlp output: {line}")
+        playlist_info_match = re.search(r'\[.*?\]\s+Playlist.*?(\d+)\s+videos?', line, re.IGNORECASE)
+        if playlist_info_match:
+            total = int(playlist_info_match.group(1))
+            with lock:
+                if store[job_id]["total"] == 0:
+                    store[job_id]["total"] = total
+        download_match = re.search(r'\[download\]\s+Downloading\s+video\s+(\d+)\s+of\s+(\d+)', line, re.IGNORECASE)
+        if download_match:
+            with lock:
+                store[job_id]["current"] = int(download_match.group(1))
+                store[job_id]["total"] = int(download_match.group(2))
+                store[job_id]["status"] = "downloading"
+        item_match = re.search(r'\[download\]\s+Downloading\s+item\s+(\d+)\s+of\s+(\d+)', line, re.IGNORECASE)
+        if item_match:
+            with lock:
+                store[job_id]["current"] = int(item_match.group(1))
+                store[job_id]["total"] = int(item_match.group(2))
+                store[job_id]["status"] = "downloading"
+        title_patterns = [
+            r'\[download\]\s+Destination:\s+.+?-\s+(.+?)\.mp3',
+            r'\[download\]\s+(.+?)\s+has already been downloaded',
+            r'\[ExtractAudio\]\s+Destination:\s+.+?-\s+(.+?)\.mp3',
+        ]
+        for pattern in title_patterns:
+            title_match = re.search(pattern, line)
+            if title_match:
+                with lock:
+                    store[job_id]["current_title"] = title_match.group(1).strip()
+                log.debug(f"Downloading: {title_match.group(1).strip()}")
+                break
+        if "[download] 100%" in line or "[ExtractAudio]" in line:
+            with lock:
+                if store[job_id]["total"] == 1 and store[job_id]["current"] == 0:
+                    store[job_id]["current"] = 1
+                elif store[job_id]["total"] > 1 and store[job_id]["current"] < store[job_id]["total"]:
+                    store[job_id]["current"] += 1
+    return store[job_id]
+
+
+def json_parse(job_id: str, lines):
+    parser = main.ProgressParser(job_id, main.PROGRESS_FLUSH_SECONDS)
+    for line in lines:
+        parser.feed(line)
+    parser.flush(force=True)
+    return main.job_store.get(job_id)
+
+
+def measure(fn, job_id: str, lines, repeat: int):
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(job_id, lines)
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tracks", type=int, default=20)
+    ap.add_argument("--ticks", type=int, default=400, help="progress lines per track")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    legacy = list(legacy_lines(args.tracks, args.ticks))
+    events = list(json_lines(args.tracks, args.ticks))
+
+    before = measure(legacy_parse, "bench-legacy", legacy, args.repeat)
+    after = measure(json_parse, "bench-json", events, args.repeat)
+    final = main.job_store.get("bench-json")
+
+    print(f"job: {args.tracks} tracks x {args.ticks} progress ticks")
+    print(f"regex scraping : {before * 1000:8.2f} ms CPU ({len(legacy)} lines)")
+    print(f"json events    : {after * 1000:8.2f} ms CPU ({len(events)} lines)")
+    print(f"speedup        : {before / after:8.2f}x" if after else "speedup        : n/a")
+    print(f"final progress : {final['current']}/{final['total']}")
+
+
+if __name__ == "__main__":
+    main_cli()
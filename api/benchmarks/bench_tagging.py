@@ -0,0 +1,110 @@
+"""Finalize wall time: tagging tracks one by one vs. on the shared tag pool.
+
+Builds an album of synthetic MP3s and runs prepare_tracks over it with a
+single tag worker and with --workers of them, embedding a cover so every save
+rewrites the file. The pool pays off when saves wait on storage, so measure
+on the volume the jobs live on, e.g. a network mount. Run from the api
+directory:
+
+    python benchmarks/bench_tagging.py --dir /mnt/nas/p2a-bench [--tracks 150] [--workers 8]
+
+On a fast local disk tagging is CPU-bound under the GIL and the pool is no
+faster, or slightly slower, which is why TAG_WORKERS defaults to 1. Set it
+higher only for storage where this benchmark shows a speedup.
+--save-latency-ms adds a sleep to every save; that only shows how the pool
+overlaps waits, not a real gain.
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="p2a-bench-"))
+os.environ.setdefault("JOB_STORE", "memory")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+from mutagen.mp3 import MP3  # noqa: E402
+
+main.logger.setLevel(logging.WARNING)
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames, ~38 per second
+FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+FRAMES_PER_SECOND = 38
+
+
+def make_album(job_dir: Path, tracks: int, seconds: int):
+    job_dir.mkdir(parents=True, exist_ok=True)
+    audio = FRAME * (seconds * FRAMES_PER_SECOND)
+    ordered = []
+    for i in range(1, tracks + 1):
+        path = job_dir / f"{i:02d} - Track {i}.mp3"
+        path.write_bytes(audio)
+        ordered.append(main.TrackIn(id=i, path=str(path), title=f"Track {i}"))
+    # Finalize in reverse so every track moves onto a name another track still holds
+    return list(reversed(ordered))
+
+
+def run(job_id: str, tracks, cover: bytes, workers: int) -> float:
+    main.tag_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tag")
+    req = main.FinalizeReq(
+        job_id=job_id,
+        album=main.AlbumMeta(title="Bench Album", artist="Bench Artist", year="2024"),
+        ordered_tracks=tracks,
+    )
+    started = time.perf_counter()
+    paths, failed = main.prepare_tracks(req, cover)
+    elapsed = time.perf_counter() - started
+    main.tag_pool.shutdown()
+    assert not failed and len(paths) == len(tracks), failed
+    assert [p.name for p in paths] == [f"{i:02d} - {t.title}.mp3" for i, t in enumerate(tracks, start=1)]
+    return elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=150)
+    parser.add_argument("--seconds", type=int, default=180, help="length of each synthetic track")
+    parser.add_argument("--workers", type=int, default=8, help="pool size to compare against one worker")
+    parser.add_argument("--dir", type=Path, default=None, help="where to build the album (default: DATA_DIR)")
+    parser.add_argument("--save-latency-ms", type=float, default=0.0, help="sleep added to every save (simulation only)")
+    args = parser.parse_args()
+
+    if args.dir is not None:
+        args.dir.mkdir(parents=True, exist_ok=True)
+        main.JOBS_DIR = args.dir
+
+    if args.save_latency_ms > 0:
+        save = MP3.save
+
+        def slow_save(self, *a, **kw):
+            time.sleep(args.save_latency_ms / 1000)
+            return save(self, *a, **kw)
+
+        MP3.save = slow_save
+
+    cover = os.urandom(200 * 1024)
+    results = {}
+    for workers in (1, args.workers):
+        job_id = f"bench-tagging-{workers}"
+        job_dir = main.JOBS_DIR / job_id
+        tracks = make_album(job_dir, args.tracks, args.seconds)
+        try:
+            results[workers] = run(job_id, tracks, cover, workers)
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    simulated = f", {args.save_latency_ms:g} ms sleep added per save" if args.save_latency_ms > 0 else ""
+    print(f"{args.tracks} tracks x {args.seconds}s, 200 KB cover, in {main.JOBS_DIR}{simulated}")
+    for workers, elapsed in results.items():
+        print(f"  {workers:>2} tag worker(s): {elapsed:7.2f} s  ({elapsed / args.tracks * 1000:6.1f} ms/track)")
+    print(f"  speedup: {results[1] / results[args.workers]:.1f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,8 +1,8 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pathlib import Path
 import subprocess
 import uuid
@@ -12,11 +12,24 @@ import base64
 import json
 import re
 import os
+import hashlib
 import logging
 import threading
+import asyncio
+import random
+import signal
+import socket
+import sqlite3
+import time
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import yt_dlp
 from urllib import request as urllib_request
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from urllib.error import URLError, HTTPError
-from collections import defaultdict
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
 
 # Configure logging
 logging.basicConfig(
@@ -30,15 +43,952 @@ DATA_DIR = Path(os.environ.get("DATA_DIR", "/data"))
 MUSIC_LIBRARY_ROOT = Path(os.environ.get("MUSIC_LIBRARY_ROOT", "/music")).resolve()
 JOBS_DIR = DATA_DIR / "jobs"
 OUT_DIR = DATA_DIR / "out"
+FFMPEG_LOCATION = os.environ.get("FFMPEG_LOCATION", "/usr/bin/ffmpeg")
+# "api" drives yt_dlp.YoutubeDL in-process, "cli" forks the yt-dlp executable per job
+DOWNLOAD_ENGINE = os.environ.get("DOWNLOAD_ENGINE", "api").strip().lower()
+# Playlist entries downloaded concurrently per job (api engine); jobs may ask for up to the max
+DOWNLOAD_CONCURRENCY = int(os.environ.get("DOWNLOAD_CONCURRENCY", "4"))
+MAX_DOWNLOAD_CONCURRENCY = int(os.environ.get("MAX_DOWNLOAD_CONCURRENCY", "16"))
+# Failed entries are retried with exponential backoff and jitter before being given up on
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", "3"))
+RETRY_BACKOFF_SECONDS = float(os.environ.get("RETRY_BACKOFF_SECONDS", "2"))
+RETRY_BACKOFF_MAX_SECONDS = float(os.environ.get("RETRY_BACKOFF_MAX_SECONDS", "60"))
+# Minimum spacing between job store writes for byte-level progress ticks from either engine
+PROGRESS_FLUSH_SECONDS = float(
+    os.environ.get("PROGRESS_FLUSH_SECONDS", os.environ.get("CLI_PROGRESS_FLUSH_SECONDS", "0.25"))
+)
+# Server-sent event streams coalesce changes to at most one message per interval
+SSE_MIN_INTERVAL_SECONDS = float(os.environ.get("SSE_MIN_INTERVAL_SECONDS", "0.25"))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("SSE_KEEPALIVE_SECONDS", "15"))
+# Upper bound for /progress?wait= long-polls
+PROGRESS_MAX_WAIT_SECONDS = float(os.environ.get("PROGRESS_MAX_WAIT_SECONDS", "30"))
+# ffmpeg encodes run on a shared CPU-bound pool, separate from the network-bound downloads
+MP3_QUALITY = "5"
+TRANSCODE_WORKERS = int(os.environ.get("TRANSCODE_WORKERS", str(os.cpu_count() or 2)))
+# Finalize tags tracks on a shared pool. On local disk tagging is CPU-bound and more workers are slower;
+# raise it only where saves wait on slow storage (e.g. a network mount) and benchmarks/bench_tagging.py
+# shows a gain there
+TAG_WORKERS = int(os.environ.get("TAG_WORKERS", "1"))
+# Jobs running at once across the API; further jobs wait in a bounded queue
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", "2"))
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", "50"))
+QUEUE_RETRY_AFTER_SECONDS = int(os.environ.get("QUEUE_RETRY_AFTER_SECONDS", "30"))
+# Finished mp3s are shared across jobs by extractor + video id + output profile; 0 disables
+AUDIO_CACHE_DIR = DATA_DIR / "cache" / "audio"
+AUDIO_CACHE_MAX_MB = int(os.environ.get("AUDIO_CACHE_MAX_MB", "10240"))
+AUDIO_PROFILE = f"mp3-q{MP3_QUALITY}"
+# yt-dlp style download archives ("<extractor> <id>" per line) for library albums; job archives live in the job dir
+ARCHIVES_DIR = DATA_DIR / "archives"
+# "sqlite" persists job state to JOB_DB_PATH with write-behind flushing, "memory" keeps it process-local
+JOB_STORE = os.environ.get("JOB_STORE", "sqlite").strip().lower()
+JOB_DB_PATH = Path(os.environ.get("JOB_DB_PATH", str(DATA_DIR / "jobs.db")))
+JOB_STORE_FLUSH_SECONDS = float(os.environ.get("JOB_STORE_FLUSH_SECONDS", "0.5"))
+# Finished jobs are dropped from memory once idle this long or past this count (least recently used first),
+# then reloaded from disk on demand; 0 disables either limit
+JOB_RESIDENT_TTL_SECONDS = float(os.environ.get("JOB_RESIDENT_TTL_SECONDS", "900"))
+MAX_RESIDENT_FINISHED_JOBS = int(os.environ.get("MAX_RESIDENT_FINISHED_JOBS", "100"))
+# Janitor: job work dirs, zips and stored covers are deleted past their retention age, oldest first past a
+# size cap, and oldest first across all of them while DATA_DIR free space is under the low watermark until it
+# is back above the high one. Anything touched or finalized within the grace period is kept, as are covers
+# referenced by a job that is still on disk; 0 disables a limit
+JANITOR_INTERVAL_SECONDS = float(os.environ.get("JANITOR_INTERVAL_SECONDS", "600"))
+JANITOR_GRACE_SECONDS = float(os.environ.get("JANITOR_GRACE_SECONDS", "3600"))
+JOBS_RETENTION_HOURS = float(os.environ.get("JOBS_RETENTION_HOURS", "72"))
+OUT_RETENTION_HOURS = float(os.environ.get("OUT_RETENTION_HOURS", "24"))
+JOBS_DIR_MAX_MB = int(os.environ.get("JOBS_DIR_MAX_MB", "0"))
+OUT_DIR_MAX_MB = int(os.environ.get("OUT_DIR_MAX_MB", "0"))
+COVERS_RETENTION_HOURS = float(os.environ.get("COVERS_RETENTION_HOURS", "24"))
+COVERS_DIR_MAX_MB = int(os.environ.get("COVERS_DIR_MAX_MB", "1024"))
+JANITOR_FREE_LOW_MB = int(os.environ.get("JANITOR_FREE_LOW_MB", "1024"))
+JANITOR_FREE_HIGH_MB = int(os.environ.get("JANITOR_FREE_HIGH_MB", "4096"))
+# Disk admission: before downloading, a job reserves its estimated size (entry durations x ADMISSION_KBPS,
+# doubled for source streams held until transcoded) against DATA_DIR free space minus DISK_HEADROOM_MB.
+# A job that doesn't fit waits up to ADMISSION_WAIT_SECONDS for space, then fails
+DISK_ADMISSION = os.environ.get("DISK_ADMISSION", "true").strip().lower() in ("1", "true", "yes")
+DISK_HEADROOM_MB = int(os.environ.get("DISK_HEADROOM_MB", "512"))
+ADMISSION_KBPS = float(os.environ.get("ADMISSION_KBPS", "160"))
+ADMISSION_WAIT_SECONDS = float(os.environ.get("ADMISSION_WAIT_SECONDS", "600"))
+ADMISSION_SOURCE_FACTOR = 2.0
+ADMISSION_DEFAULT_TRACK_SECONDS = 300
+# Workers sharing JOB_DB_PATH (uvicorn --workers N) heartbeat every WORKER_HEARTBEAT_SECONDS; active jobs
+# whose owner has been silent for WORKER_STALE_SECONDS are taken over and resumed by a live worker. Job slots,
+# the queue, disk reservations and the audio cache size are shared by all of them through the same database.
+# Streams and long-polls for jobs running in another worker re-read the store every REMOTE_POLL_SECONDS, and
+# jobs waiting for a slot or disk space held by another worker re-check at the same interval
+WORKER_HEARTBEAT_SECONDS = float(os.environ.get("WORKER_HEARTBEAT_SECONDS", "2"))
+WORKER_STALE_SECONDS = float(os.environ.get("WORKER_STALE_SECONDS", "15"))
+REMOTE_POLL_SECONDS = float(os.environ.get("REMOTE_POLL_SECONDS", "1"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+# /metadata runs yt-dlp as an asyncio subprocess, at most METADATA_CONCURRENCY at a time; it is killed
+# after METADATA_TIMEOUT_SECONDS (including time spent waiting for a slot) or when the client disconnects
+METADATA_CONCURRENCY = int(os.environ.get("METADATA_CONCURRENCY", "4"))
+METADATA_TIMEOUT_SECONDS = float(os.environ.get("METADATA_TIMEOUT_SECONDS", "120"))
+# /metadata responses are cached per canonical URL for METADATA_CACHE_TTL_SECONDS, least recently used
+# first past METADATA_CACHE_MAX_ENTRIES (0 disables); METADATA_CACHE_PERSIST keeps them across restarts
+METADATA_CACHE_TTL_SECONDS = float(os.environ.get("METADATA_CACHE_TTL_SECONDS", "600"))
+METADATA_CACHE_MAX_ENTRIES = int(os.environ.get("METADATA_CACHE_MAX_ENTRIES", "256"))
+METADATA_CACHE_PERSIST = os.environ.get("METADATA_CACHE_PERSIST", "false").strip().lower() in ("1", "true", "yes")
+METADATA_CACHE_DIR = DATA_DIR / "cache" / "metadata"
+# Query parameters that don't change what a URL extracts to
+URL_IGNORED_PARAMS = {"index", "si", "feature", "pp", "t", "start_radio", "ab_channel", "fbclid", "gclid"}
+# Fast /metadata extractions are kept under a token for INFO_TOKEN_TTL_SECONDS (at least as long as the
+# metadata cache TTL) so /download can start from them instead of extracting the playlist again
+INFO_TOKEN_TTL_SECONDS = float(os.environ.get("INFO_TOKEN_TTL_SECONDS", "1800"))
+INFO_TOKEN_DIR = DATA_DIR / "cache" / "info"
+# Covers are center-cropped to a square of at most COVER_TARGET_PX and re-encoded as JPEG of at most
+# COVER_MAX_KB before being embedded (needs Pillow; without it covers are embedded as given). Normalized
+# covers are stored once under COVERS_DIR by content hash. Thumbnail downloads are capped at COVER_FETCH_MAX_MB
+COVER_TARGET_PX = int(os.environ.get("COVER_TARGET_PX", "600"))
+COVER_MAX_KB = int(os.environ.get("COVER_MAX_KB", "200"))
+COVER_FETCH_MAX_MB = int(os.environ.get("COVER_FETCH_MAX_MB", "10"))
+COVER_UPLOAD_MAX_MB = int(os.environ.get("COVER_UPLOAD_MAX_MB", "20"))
+COVERS_DIR = DATA_DIR / "covers"
+RESUME_JOBS_ON_STARTUP = os.environ.get("RESUME_JOBS_ON_STARTUP", "true").strip().lower() in ("1", "true", "yes")
 
 JOBS_DIR.mkdir(parents=True, exist_ok=True)
 OUT_DIR.mkdir(parents=True, exist_ok=True)
+ARCHIVES_DIR.mkdir(parents=True, exist_ok=True)
+
+ACTIVE_STATUSES = {"queued", "starting", "waiting_for_space", "downloading", "processing"}
+TERMINAL_STATUSES = {"completed", "completed_with_errors", "error", "cancelled"}
+
+
+class JobStore:
+    """In-memory job state keyed by job id.
+
+    Readers get shallow copies, so writers must replace nested values
+    (lists, dicts) rather than mutate them in place.
+
+    Finished jobs are evicted once idle past resident_ttl or beyond
+    max_resident of them, after spilling to JOBS_DIR/<id>/job.json, and are
+    reloaded from there when next read. Eviction runs on store activity.
+    """
+
+    def __init__(self, resident_ttl: float = 0, max_resident: int = 0):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.resident_ttl = resident_ttl
+        self.max_resident = max_resident
+        # Resident finished jobs, least recently used first
+        self._finished = OrderedDict()
+        self._last_sweep = 0.0
+        self.evictions = 0
+        self.reloads = 0
+
+    def subscribe(self, listener):
+        """Call listener(job_id) after every change; it runs on the writing thread"""
+        self._listeners.append(listener)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._touch(job_id, job)
+                return dict(job)
+        job = self._load(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job_id not in self._jobs:
+                self.reloads += 1
+            job = self._jobs.setdefault(job_id, job)
+            self._touch(job_id, job)
+            job = dict(job)
+        self._evict()
+        return job
+
+    @contextmanager
+    def edit(self, job_id: str):
+        """Yield the live job dict under the store lock for read-modify-write updates.
+
+        Every edit bumps the job's monotonically increasing version.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._load(job_id) or {}
+                self._jobs[job_id] = job
+            yield job
+            job["version"] = job.get("version", 0) + 1
+            self._touch(job_id, job)
+            self._changed(job_id, job)
+        for listener in self._listeners:
+            listener(job_id)
+        self._evict()
+
+    def update(self, job_id: str, **fields):
+        with self.edit(job_id) as job:
+            job.update(fields)
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._finished.pop(job_id, None)
+        self._remove(job_id)
+
+    def peek(self, job_id: str) -> Optional[dict]:
+        """Read a job without making an evicted one resident again"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._load(job_id)
+
+    def find(self, statuses: set) -> List[tuple]:
+        with self._lock:
+            return [(job_id, dict(job)) for job_id, job in self._jobs.items() if job.get("status") in statuses]
+
+    # Ownership hooks for stores shared between worker processes; a process-local store owns everything
+    shared = False
+
+    def is_local(self, job_id: str) -> bool:
+        return True
+
+    def claim(self, job_id: str) -> bool:
+        return True
+
+    def claim_stale(self, statuses: set, stale_after: float) -> List[tuple]:
+        return self.find(statuses)
+
+    def request_cancel(self, job_id: str, stale_after: float) -> bool:
+        return False
+
+    def cancel_requests(self) -> List[str]:
+        return []
+
+    def heartbeat(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            finished = len(self._finished)
+        return {
+            "resident_jobs": len(jobs),
+            "resident_finished_jobs": finished,
+            # Serialized size, a stand-in for the memory the job dicts hold
+            "approx_bytes": sum(len(json.dumps(job, default=str)) for job in jobs),
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+        }
+
+    def _touch(self, job_id: str, job: dict):
+        # Called under the lock
+        if job.get("status") in TERMINAL_STATUSES:
+            self._finished[job_id] = time.monotonic()
+            self._finished.move_to_end(job_id)
+        else:
+            self._finished.pop(job_id, None)
+
+    def _evict(self):
+        if not self.resident_ttl and not self.max_resident:
+            return
+        now = time.monotonic()
+        with self._lock:
+            over = len(self._finished) - self.max_resident if self.max_resident else 0
+            if over <= 0 and now - self._last_sweep < 1.0:
+                return
+            self._last_sweep = now
+            candidates = []
+            for job_id, touched in self._finished.items():
+                if over <= 0 and not (self.resident_ttl and now - touched > self.resident_ttl):
+                    break
+                candidates.append((job_id, dict(self._jobs[job_id])))
+                over -= 1
+
+        for job_id, job in candidates:
+            if not self._spill(job_id, job):
+                continue
+            with self._lock:
+                current = self._jobs.get(job_id)
+                # Skip jobs that changed or were read back into use while spilling
+                if current is None or current.get("version") != job.get("version") or job_id not in self._finished:
+                    continue
+                del self._jobs[job_id]
+                del self._finished[job_id]
+                self.evictions += 1
+
+    def _spill_path(self, job_id: str) -> Path:
+        return JOBS_DIR / job_id / "job.json"
+
+    def _spill(self, job_id: str, job: dict) -> bool:
+        """Make the job reloadable by _load before it is dropped from memory"""
+        path = self._spill_path(job_id)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(json.dumps(job, default=str), encoding="utf-8")
+            os.replace(tmp, path)
+            return True
+        except OSError as e:
+            logger.warning(f"Could not spill job {job_id} to disk: {e}")
+            return False
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        try:
+            return json.loads(self._spill_path(job_id).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _changed(self, job_id: str, job: dict):
+        pass
+
+    def _remove(self, job_id: str):
+        self._spill_path(job_id).unlink(missing_ok=True)
+
+
+class SQLiteJobStore(JobStore):
+    """Job state persisted to an SQLite database in WAL mode, shared by all API workers.
+
+    Each job is owned by the worker that runs it. The owner reads and writes
+    its in-memory copy and a background thread flushes dirty jobs in batches,
+    immediately when a job's status changes. Every other job is read straight
+    from the database and edited in a write transaction, so any worker can
+    answer for any job. Finished jobs leave memory once flushed.
+    """
+
+    shared = True
+
+    def __init__(self, path: Path, flush_interval: float, resident_ttl: float = 0, max_resident: int = 0):
+        super().__init__(resident_ttl, max_resident)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._dirty = set()
+        self._owned = set()
+        self._statuses = {}
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "jobId TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, updatedAt REAL NOT NULL, "
+            "ownerId TEXT, cancelRequested INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, ddl in (("ownerId", "ownerId TEXT"), ("cancelRequested", "cancelRequested INTEGER NOT NULL DEFAULT 0")):
+            if column not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {ddl}")
+                except sqlite3.OperationalError:
+                    pass  # Another worker added it first
+        conn.execute("CREATE INDEX IF NOT EXISTS jobsStatus ON jobs (status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobsOwner ON jobs (ownerId)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers ("
+            "workerId TEXT PRIMARY KEY, hostname TEXT, pid INTEGER, startedAt REAL NOT NULL, heartbeatAt REAL NOT NULL)"
+        )
+        conn.commit()
+        self.started_at = time.time()
+        self.heartbeat()
+        self._flusher = threading.Thread(target=self._flush_loop, name="job-store-flush", daemon=True)
+        self._flusher.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def is_local(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._owned
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and (job_id in self._owned or job_id in self._dirty):
+                return dict(job)
+        return self._load(job_id)
+
+    peek = get
+
+    @contextmanager
+    def edit(self, job_id: str):
+        if self.is_local(job_id):
+            with super().edit(job_id) as job:
+                yield job
+            return
+
+        # Another worker may own the job: read-modify-write its row in one transaction
+        self.flush()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE jobId = ?", (job_id,)).fetchone()
+            job = json.loads(row[0]) if row else {}
+            yield job
+            job["version"] = job.get("version", 0) + 1
+            conn.execute(
+                "INSERT INTO jobs (jobId, status, data, updatedAt) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(jobId) DO UPDATE SET status = excluded.status, data = excluded.data, "
+                "updatedAt = excluded.updatedAt",
+                (job_id, job.get("status") or "", json.dumps(job, default=str), time.time()),
+            )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        for listener in self._listeners:
+            listener(job_id)
+
+    def claim(self, job_id: str) -> bool:
+        """Make this worker the job's owner, for jobs it creates or re-runs"""
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE jobs SET ownerId = ?, cancelRequested = 0 WHERE jobId = ?", (WORKER_ID, job_id))
+        with self._lock:
+            self._owned.add(job_id)
+            if job_id not in self._dirty:
+                # Reload the current row rather than trusting a copy from before the claim
+                self._jobs.pop(job_id, None)
+                self._finished.pop(job_id, None)
+        return True
+
+    def claim_stale(self, statuses: set, stale_after: float) -> List[tuple]:
+        """Take over active jobs whose owner stopped heartbeating.
+
+        Each takeover is a conditional update on the previous owner, so only
+        one worker wins a job.
+        """
+        self.flush()
+        conn = self._connect()
+        cutoff = time.time() - stale_after
+        placeholders = ",".join("?" for _ in statuses)
+        rows = conn.execute(
+            f"SELECT j.jobId, j.ownerId FROM jobs j LEFT JOIN workers w ON w.workerId = j.ownerId "
+            f"WHERE j.status IN ({placeholders}) AND (j.ownerId IS NULL OR "
+            f"(j.ownerId != ? AND (w.workerId IS NULL OR w.heartbeatAt < ?)))",
+            (*statuses, WORKER_ID, cutoff),
+        ).fetchall()
+        claimed = []
+        for job_id, owner in rows:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE jobs SET ownerId = ? WHERE jobId = ? AND ownerId IS ?", (WORKER_ID, job_id, owner)
+                )
+            if not cursor.rowcount:
+                continue
+            with self._lock:
+                self._owned.add(job_id)
+                self._jobs.pop(job_id, None)
+            job = self.get(job_id)
+            if job is not None:
+                claimed.append((job_id, job))
+        with conn:
+            conn.execute("DELETE FROM workers WHERE heartbeatAt < ?", (time.time() - 86400,))
+        return claimed
+
+    def request_cancel(self, job_id: str, stale_after: float) -> bool:
+        """Flag a job for its owner to cancel; False if no other live worker owns it"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET cancelRequested = 1 WHERE jobId = ? AND ownerId != ? AND ownerId IN "
+                "(SELECT workerId FROM workers WHERE heartbeatAt >= ?)",
+                (job_id, WORKER_ID, time.time() - stale_after),
+            )
+        return cursor.rowcount > 0
+
+    def cancel_requests(self) -> List[str]:
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT jobId FROM jobs WHERE ownerId = ? AND cancelRequested = 1", (WORKER_ID,)
+        ).fetchall()
+        if rows:
+            with conn:
+                conn.executemany("UPDATE jobs SET cancelRequested = 0 WHERE jobId = ?", rows)
+        return [row[0] for row in rows]
+
+    def heartbeat(self):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO workers (workerId, hostname, pid, startedAt, heartbeatAt) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(workerId) DO UPDATE SET heartbeatAt = excluded.heartbeatAt",
+                (WORKER_ID, socket.gethostname(), os.getpid(), self.started_at, time.time()),
+            )
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT data FROM jobs WHERE jobId = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _changed(self, job_id: str, job: dict):
+        self._dirty.add(job_id)
+        status = job.get("status")
+        if status in TERMINAL_STATUSES:
+            self._owned.discard(job_id)
+        # Status changes are flushed right away so other workers see them promptly
+        if self._statuses.get(job_id) != status:
+            self._statuses[job_id] = status
+            self._wake.set()
+
+    def _spill(self, job_id: str, job: dict) -> bool:
+        # Flushed jobs are already in the database; dirty ones wait for the next sweep
+        with self._flush_lock, self._lock:
+            return job_id not in self._dirty
+
+    def _remove(self, job_id: str):
+        with self._lock:
+            self._dirty.discard(job_id)
+            self._owned.discard(job_id)
+            self._statuses.pop(job_id, None)
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE jobId = ?", (job_id,))
+
+    def find(self, statuses: set) -> List[tuple]:
+        self.flush()
+        placeholders = ",".join("?" for _ in statuses)
+        rows = self._connect().execute(
+            f"SELECT jobId, data FROM jobs WHERE status IN ({placeholders})", tuple(statuses)
+        ).fetchall()
+        return [(job_id, self.get(job_id) or json.loads(data)) for job_id, data in rows]
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending = [
+                    (job_id, dict(self._jobs[job_id]), job_id in self._owned)
+                    for job_id in self._dirty if job_id in self._jobs
+                ]
+                self._dirty.clear()
+            if not pending:
+                return
+            now = time.time()
+            rows = [
+                (job_id, job.get("status") or "", json.dumps(job, default=str), now, WORKER_ID if owned else None, WORKER_ID)
+                for job_id, job, owned in pending
+            ]
+            conn = self._connect()
+            with conn:
+                # A worker whose job was taken over after it went quiet must not overwrite the new owner
+                conn.executemany(
+                    "INSERT INTO jobs (jobId, status, data, updatedAt, ownerId) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(jobId) DO UPDATE SET status = excluded.status, data = excluded.data, "
+                    "updatedAt = excluded.updatedAt, ownerId = COALESCE(excluded.ownerId, jobs.ownerId) "
+                    "WHERE jobs.ownerId IS NULL OR jobs.ownerId = ?",
+                    rows,
+                )
+            with self._lock:
+                for job_id, _, _ in pending:
+                    if job_id not in self._owned and job_id not in self._dirty:
+                        self._jobs.pop(job_id, None)
+                        self._finished.pop(job_id, None)
+                        self._statuses.pop(job_id, None)
+                        self.evictions += 1
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to flush job store: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            owned = len(self._owned)
+        live = self._connect().execute(
+            "SELECT COUNT(*) FROM workers WHERE heartbeatAt >= ?", (time.time() - WORKER_STALE_SECONDS,)
+        ).fetchone()[0]
+        return {**super().stats(), "worker_id": WORKER_ID, "owned_jobs": owned, "live_workers": live}
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        # Lets the other workers take over this worker's unfinished jobs right away
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM workers WHERE workerId = ?", (WORKER_ID,))
+
+
+def create_job_store() -> JobStore:
+    retention = {"resident_ttl": JOB_RESIDENT_TTL_SECONDS, "max_resident": MAX_RESIDENT_FINISHED_JOBS}
+    if JOB_STORE == "memory":
+        return JobStore(**retention)
+    return SQLiteJobStore(JOB_DB_PATH, JOB_STORE_FLUSH_SECONDS, **retention)
+
+
+job_store = create_job_store()
+
+
+class WorkerBoard:
+    """Running slots, queue order, disk reservations and audio cache usage shared by
+    all API workers through the job database.
+
+    Rows belong to the worker that wrote them and only count while that worker
+    heartbeats, so a crashed worker's slots and reservations free themselves.
+    Every check-and-claim runs in one BEGIN IMMEDIATE transaction.
+    """
+
+    def __init__(self, path: Path, stale_after: float):
+        self.path = path
+        self.stale_after = stale_after
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS schedule ("
+            "jobId TEXT PRIMARY KEY, workerId TEXT NOT NULL, state TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, enqueuedAt REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservations (jobId TEXT PRIMARY KEY, workerId TEXT NOT NULL, bytes INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS audioCache (cacheKey TEXT PRIMARY KEY, bytes INTEGER NOT NULL, usedAt REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS audioCacheUsed ON audioCache (usedAt)")
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=10, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _live(self) -> tuple:
+        # SQL condition and parameter matching rows owned by a worker that is still heartbeating
+        return "workerId IN (SELECT workerId FROM workers WHERE heartbeatAt >= ?)", time.time() - self.stale_after
+
+    def _counts(self, conn: sqlite3.Connection) -> dict:
+        live, since = self._live()
+        rows = conn.execute(f"SELECT state, COUNT(*) FROM schedule WHERE {live} GROUP BY state", (since,)).fetchall()
+        return {state: n for state, n in rows}
+
+    def enqueue(self, job_id: str, priority: int, max_queued: int, max_running: int, force: bool = False) -> bool:
+        """Queue a job unless the shared queue is full; waiting counts jobs that gave their slot up"""
+        with self._transaction() as conn:
+            counts = self._counts(conn)
+            waiting = counts.get("queued", 0) + counts.get("yielded", 0)
+            running = counts.get("running", 0) + counts.get("reclaiming", 0)
+            if not force and waiting >= max_queued and running >= max_running:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO schedule (jobId, workerId, state, priority, enqueuedAt) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, WORKER_ID, priority, time.time()),
+            )
+            return True
+
+    def _ahead(self, conn: sqlite3.Connection, job_id: str) -> Optional[int]:
+        """Live queued jobs ordered before a queued job, or None if it isn't queued"""
+        row = conn.execute(
+            "SELECT priority, enqueuedAt FROM schedule WHERE jobId = ? AND state = 'queued'", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        live, since = self._live()
+        return conn.execute(
+            f"SELECT COUNT(*) FROM schedule WHERE state = 'queued' AND {live} AND "
+            "(priority > ? OR (priority = ? AND (enqueuedAt < ? OR (enqueuedAt = ? AND jobId < ?))))",
+            (since, row[0], row[0], row[1], row[1], job_id),
+        ).fetchone()[0]
+
+    def acquire(self, job_id: str, max_running: int) -> bool:
+        """Start a queued job if a slot is free and no job queued on any worker is ahead of it"""
+        with self._transaction() as conn:
+            counts = self._counts(conn)
+            free = max_running - counts.get("running", 0) - counts.get("reclaiming", 0)
+            ahead = self._ahead(conn, job_id)
+            if free <= 0 or (ahead or 0) >= free:
+                return False
+            conn.execute(
+                "INSERT INTO schedule (jobId, workerId, state, priority, enqueuedAt) VALUES (?, ?, 'running', 0, ?) "
+                "ON CONFLICT(jobId) DO UPDATE SET workerId = excluded.workerId, state = 'running'",
+                (job_id, WORKER_ID, time.time()),
+            )
+            return True
+
+    def set_state(self, job_id: str, state: str):
+        with self._transaction() as conn:
+            conn.execute("UPDATE schedule SET state = ? WHERE jobId = ? AND workerId = ?", (state, job_id, WORKER_ID))
+
+    def reclaim(self, job_id: str, max_running: int) -> bool:
+        """Give a job that yielded its slot a running one back, ahead of queued jobs"""
+        with self._transaction() as conn:
+            if self._counts(conn).get("running", 0) >= max_running:
+                return False
+            conn.execute("UPDATE schedule SET state = 'running' WHERE jobId = ? AND workerId = ?", (job_id, WORKER_ID))
+            return True
+
+    def remove(self, job_id: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM schedule WHERE jobId = ? AND workerId = ?", (job_id, WORKER_ID))
+
+    def position(self, job_id: str) -> Optional[int]:
+        ahead = self._ahead(self._connect(), job_id)
+        return None if ahead is None else ahead + 1
+
+    def reserve(self, job_id: str, nbytes: int, budget: int) -> bool:
+        """Reserve nbytes for a job if the live reservations of all workers leave room within budget"""
+        with self._transaction() as conn:
+            if self._reserved(conn, exclude=job_id) + nbytes > budget:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO reservations (jobId, workerId, bytes) VALUES (?, ?, ?)", (job_id, WORKER_ID, nbytes)
+            )
+            return True
+
+    def release(self, job_id: str, nbytes: Optional[int] = None):
+        """Return part of a job's reservation, or all of it when nbytes is None"""
+        with self._transaction() as conn:
+            if nbytes is not None:
+                conn.execute("UPDATE reservations SET bytes = bytes - ? WHERE jobId = ?", (nbytes, job_id))
+            conn.execute(
+                "DELETE FROM reservations WHERE jobId = ? AND (? OR bytes <= 0)", (job_id, nbytes is None)
+            )
+
+    def _reserved(self, conn: sqlite3.Connection, exclude: Optional[str] = None) -> int:
+        live, since = self._live()
+        row = conn.execute(
+            f"SELECT COALESCE(SUM(bytes), 0) FROM reservations WHERE {live} AND jobId IS NOT ?", (since, exclude)
+        ).fetchone()
+        return row[0]
+
+    def reserved(self) -> tuple:
+        """Total live reserved bytes and the number of reservations"""
+        live, since = self._live()
+        return self._connect().execute(
+            f"SELECT COALESCE(SUM(bytes), 0), COUNT(*) FROM reservations WHERE {live}", (since,)
+        ).fetchone()
+
+    def cache_seed(self, entries: List[tuple]):
+        """Record (key, bytes, used_at) for cache files already on disk"""
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO audioCache (cacheKey, bytes, usedAt) VALUES (?, ?, ?)", entries)
+
+    def cache_add(self, key: str, nbytes: int, max_bytes: int) -> List[str]:
+        """Record a stored entry; returns the least recently used keys to delete to stay within max_bytes"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO audioCache (cacheKey, bytes, usedAt) VALUES (?, ?, ?)", (key, nbytes, time.time())
+            )
+            total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM audioCache").fetchone()[0]
+            evicted = []
+            if total > max_bytes:
+                for old_key, old_bytes in conn.execute(
+                    "SELECT cacheKey, bytes FROM audioCache WHERE cacheKey != ? ORDER BY usedAt", (key,)
+                ).fetchall():
+                    if total <= max_bytes:
+                        break
+                    evicted.append(old_key)
+                    total -= old_bytes
+                conn.executemany("DELETE FROM audioCache WHERE cacheKey = ?", [(k,) for k in evicted])
+            return evicted
+
+    def cache_touch(self, key: str):
+        with self._transaction() as conn:
+            conn.execute("UPDATE audioCache SET usedAt = ? WHERE cacheKey = ?", (time.time(), key))
+
+    def cache_remove(self, key: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM audioCache WHERE cacheKey = ?", (key,))
+
+    def cache_usage(self) -> tuple:
+        return self._connect().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM audioCache").fetchone()
+
+    def prune(self):
+        """Drop rows of workers that shut down or were forgotten; a worker only late to heartbeat keeps its rows"""
+        with self._transaction() as conn:
+            for table in ("schedule", "reservations"):
+                conn.execute(f"DELETE FROM {table} WHERE workerId NOT IN (SELECT workerId FROM workers)")
+
+    def stats(self) -> dict:
+        counts = self._counts(self._connect())
+        reserved, reservations = self.reserved()
+        return {
+            "running": counts.get("running", 0) + counts.get("reclaiming", 0),
+            "yielded": counts.get("yielded", 0),
+            "queued": counts.get("queued", 0),
+            "reserved_bytes": reserved,
+            "reservations": reservations,
+        }
+
+
+# Set when workers share the job database; the scheduler, disk budget and audio cache coordinate through it
+worker_board = WorkerBoard(JOB_DB_PATH, WORKER_STALE_SECONDS) if job_store.shared else None
+
+
+class JobWatchers:
+    """Wakes asyncio tasks waiting on job changes made from worker threads.
+
+    Each watched job has one asyncio.Event shared by all of its watchers; a
+    change sets it and drops it, so the next wait gets a fresh one. Every
+    event() is paired with a release() (wait() releases for the caller), and
+    the event is dropped once no holder is left. Jobs nobody watches cost a
+    dict lookup per change.
+    """
+
+    def __init__(self):
+        self._loop = None
+        # job_id -> [event, number of holders]
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def event(self, job_id: str) -> asyncio.Event:
+        """Grab the event before reading job state so no change can slip in between"""
+        with self._lock:
+            entry = self._events.get(job_id)
+            if entry is None:
+                entry = self._events[job_id] = [asyncio.Event(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    async def wait(self, job_id: str, event: asyncio.Event, timeout: float) -> bool:
+        """Wait for a change and release the event; returns False on timeout"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.release(job_id, event)
+
+    def release(self, job_id: str, event: asyncio.Event):
+        """Give up an event from event(); it is dropped with its last holder so idle jobs don't accumulate"""
+        with self._lock:
+            entry = self._events.get(job_id)
+            # An event already fired by notify() is no longer tracked
+            if entry is not None and entry[0] is event:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._events[job_id]
+
+    def notify(self, job_id: str):
+        loop = self._loop
+        if loop is None:
+            return
+        with self._lock:
+            entry = self._events.pop(job_id, None)
+        if entry is not None:
+            loop.call_soon_threadsafe(entry[0].set)
+
+    def watched(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+
+job_watchers = JobWatchers()
+job_store.subscribe(job_watchers.notify)
+archive_lock = threading.Lock()
+
+transcode_pool = ThreadPoolExecutor(max_workers=max(1, TRANSCODE_WORKERS), thread_name_prefix="transcode")
+tag_pool = ThreadPoolExecutor(max_workers=max(1, TAG_WORKERS), thread_name_prefix="tag")
+
+
+def update_progress(job_id: str, **fields):
+    job_store.update(job_id, **fields)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobControl:
+    """Cancellation flag and child process groups of a running job"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._procs = set()
+        self._lock = threading.Lock()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def register(self, proc: subprocess.Popen):
+        with self._lock:
+            self._procs.add(proc)
+        if self.cancelled.is_set():
+            kill_process_group(proc)
+
+    def unregister(self, proc: subprocess.Popen):
+        with self._lock:
+            self._procs.discard(proc)
 
-# In-memory progress tracking
-progress_store = defaultdict(dict)
-progress_lock = threading.Lock()
+    def cancel(self):
+        self.cancelled.set()
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            kill_process_group(proc)
 
-app = FastAPI(title="Playlist2Album API")
+
+def kill_process_group(proc: subprocess.Popen, grace: float = 5.0):
+    """SIGTERM a child's process group (started with start_new_session), then SIGKILL"""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            proc.wait(timeout=grace)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+job_controls = {}
+job_controls_lock = threading.Lock()
+
+
+def job_control(job_id: str) -> JobControl:
+    with job_controls_lock:
+        control = job_controls.get(job_id)
+        if control is None:
+            control = job_controls[job_id] = JobControl()
+        return control
+
+
+def release_job_control(job_id: str):
+    with job_controls_lock:
+        job_controls.pop(job_id, None)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_watchers.bind(asyncio.get_running_loop())
+    if RESUME_JOBS_ON_STARTUP:
+        try:
+            resume_interrupted_jobs()
+        except Exception as e:
+            logger.error(f"Failed to resume interrupted jobs: {e}")
+    janitor.start()
+    if job_store.shared:
+        worker_heartbeat.start()
+    yield
+    worker_heartbeat.stop()
+    janitor.stop()
+    job_store.close()
+
+
+app = FastAPI(title="Playlist2Album API", lifespan=lifespan)
 
 # Enable CORS for local development
 cors_origins_env = os.environ.get("CORS_ORIGINS", "http://localhost:3000,http://localhost:8546")
@@ -75,263 +1025,2423 @@ class TrackIn(BaseModel):
 class DownloadReq(BaseModel):
     playlist_url: str
     album: AlbumMeta
+    concurrency: Optional[int] = Field(default=None, ge=1)
+    priority: int = Field(default=0)
+    # "job" appends new playlist entries to sync_job_id, "library" to the album's library folder
+    sync: Optional[str] = Field(default=None, pattern="^(job|library)$")
+    sync_job_id: Optional[str] = None
+    # From /metadata; skips re-extracting the playlist when it was issued for the same URL
+    info_token: Optional[str] = Field(default=None, pattern="^[0-9a-f]{32}$")
+    # Stored cover the job will be finalized with; the janitor keeps it while the job is on disk
+    cover_id: Optional[str] = Field(default=None, pattern="^[0-9a-f]{64}$")
+
+
+class MetadataReq(BaseModel):
+    playlist_url: str
+    # "fast" lists playlist entries without resolving each one; "full" resolves every entry.
+    # Flat listings carry no dates, so fast mode takes the year from the playlist itself or,
+    # failing that, resolves just the first entry
+    mode: str = Field(default="fast", pattern="^(fast|full)$")
+
+
+class MetadataResp(BaseModel):
+    title: str = Field(default="")
+    artist: str = Field(default="")
+    year: str = Field(default="")
+    # Normalized playlist thumbnail, served from cover_url and accepted as FinalizeReq.cover_id
+    cover_id: Optional[str] = None
+    cover_url: Optional[str] = None
+    entry_count: Optional[int] = None
+    info_token: Optional[str] = None
+
+
+class MetadataEntriesReq(BaseModel):
+    playlist_url: str
+    offset: int = Field(default=0, ge=0)
+    limit: int = Field(default=50, ge=1, le=500)
+
+
+class PlaylistEntry(BaseModel):
+    index: int
+    id: Optional[str] = None
+    title: Optional[str] = None
+    duration: Optional[float] = None
+
+
+class MetadataEntriesResp(BaseModel):
+    entries: List[PlaylistEntry]
+    offset: int
+    limit: int
+    total: Optional[int] = None
+    has_more: bool = False
+
+
+class FailedEntry(BaseModel):
+    index: Optional[int] = None
+    id: Optional[str] = None
+    title: Optional[str] = None
+    reason: str
+    attempts: int = 1
+
+
+class DownloadResp(BaseModel):
+    job_id: str
+    out_dir: str
+    tracks: List[TrackIn]
+    failed: List[FailedEntry] = Field(default_factory=list)
+
+
+class FinalizeReq(BaseModel):
+    job_id: str
+    album: AlbumMeta
+    ordered_tracks: List[TrackIn]
+    # A cover from POST /covers or /metadata, by ID or by its /covers/<id> URL; cover_base64 is still accepted
+    cover_id: Optional[str] = Field(default=None, pattern="^[0-9a-f]{64}$")
+    cover_url: Optional[str] = None
+    cover_base64: Optional[str] = None
+
+
+class CoverResp(BaseModel):
+    cover_id: str
+    cover_url: str
+    bytes: int
+
+
+class FailedTrack(BaseModel):
+    id: int
+    title: str
+    reason: str
+
+
+class FinalizeResp(BaseModel):
+    ok: bool
+    zip_url: str
+    count: int
+    # Bytes the album did not gain from embedding the normalized instead of the original cover
+    cover_bytes_saved: int = 0
+    # Tracks left out because they could not be tagged or renamed
+    failed: List[FailedTrack] = Field(default_factory=list)
+
+
+class LibraryFinalizeResp(BaseModel):
+    ok: bool
+    library_path: str
+    count: int
+    cover_bytes_saved: int = 0
+    failed: List[FailedTrack] = Field(default_factory=list)
+
+
+class CancelResp(BaseModel):
+    job_id: str
+    status: str
+
+
+class TrackProgress(BaseModel):
+    index: Optional[int] = None
+    title: Optional[str] = None
+    downloaded_bytes: int = 0
+    total_bytes: Optional[int] = None
+    speed: Optional[float] = None
+    percent: Optional[float] = None
+
+
+class ProgressResp(BaseModel):
+    job_id: str
+    current: int
+    total: int
+    status: str
+    current_title: Optional[str] = None
+    queue_position: Optional[int] = None
+    stages: Optional[dict] = None
+    failed_count: int = 0
+    # Entries downloading right now, plus totals across the job in bytes and bytes/s
+    downloads: List[TrackProgress] = Field(default_factory=list)
+    downloaded_bytes: int = 0
+    speed: Optional[float] = None
+    average_speed: Optional[float] = None
+    eta_seconds: Optional[int] = None
+    version: int = 0
+    # Server-suggested delay before the next poll; None once the job is finished
+    poll_after_ms: Optional[int] = None
+
+
+PROGRESS_MARKER = "P2A "
+# One JSON object per line: progress ticks from --progress-template, entry start/finish from --print
+PROGRESS_TICK_PREFIX = PROGRESS_MARKER + '{"event":"progress"'
+CLI_PROGRESS_TEMPLATE = (
+    PROGRESS_TICK_PREFIX + ',"downloaded_bytes":%(progress.downloaded_bytes|null)s,'
+    '"total_bytes":%(progress.total_bytes|null)s,"total_bytes_estimate":%(progress.total_bytes_estimate|null)s,'
+    '"speed":%(progress.speed|null)s,"eta":%(progress.eta|null)s,'
+    '"index":%(info.playlist_index|null)s,"n_entries":%(info.n_entries|null)s,"title":%(info.title)j}'
+)
+CLI_START_TEMPLATE = (
+    PROGRESS_MARKER + '{"event":"start","index":%(playlist_index|null)s,'
+    '"n_entries":%(n_entries|null)s,"id":%(id)j,"title":%(title)j,"duration":%(duration|null)s}'
+)
+CLI_POSTPROCESS_TEMPLATE = (
+    PROGRESS_MARKER + '{"event":"postprocess","status":%(progress.status)j,'
+    '"postprocessor":%(progress.postprocessor)j,"index":%(info.playlist_index|null)s}'
+)
+CLI_FINISHED_TEMPLATE = (
+    PROGRESS_MARKER + '{"event":"finished","index":%(playlist_index|null)s,'
+    '"id":%(id)j,"extractor_key":%(extractor_key)j,"title":%(title)j,"filepath":%(filepath)j}'
+)
+
+
+class JobThroughput:
+    """Folds per-entry byte progress into job-level speed and a duration-weighted ETA.
+
+    Entries are weighted by their duration from the playlist metadata, falling
+    back to the mean known duration, so three 90-minute mixes aren't estimated
+    like three short tracks. An entry counts as done once its download
+    finishes; transcodes overlap the downloads still running.
+    """
+
+    def __init__(self, job_id: str, expected: int = 0, min_interval: float = 0.25):
+        self.job_id = job_id
+        self.expected = expected
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._weights = {}
+        self._active = {}
+        self._done = set()
+        self._dropped = 0
+        self._bytes_done = 0
+        self._started = None
+        self._last_publish = 0.0
+
+    def plan(self, index: int, duration: Optional[float] = None):
+        with self._lock:
+            self._weights[index] = float(duration) if duration else None
+
+    def expect(self, count: int):
+        with self._lock:
+            self.expected = max(self.expected, count)
+
+    def update(self, index: int, title: Optional[str], downloaded_bytes: int, total_bytes: Optional[int], speed: Optional[float]):
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+            self._weights.setdefault(index, None)
+            self._active[index] = {
+                "index": index,
+                "title": title,
+                "downloaded_bytes": downloaded_bytes or 0,
+                "total_bytes": total_bytes,
+                "speed": speed,
+            }
+
+    def reset(self, index: int):
+        """Forget a failed attempt's partial progress; the entry stays planned for its retry"""
+        with self._lock:
+            self._active.pop(index, None)
+
+    def finish(self, index: int):
+        with self._lock:
+            entry = self._active.pop(index, None)
+            if entry:
+                self._bytes_done += entry["downloaded_bytes"]
+            self._weights.setdefault(index, None)
+            self._done.add(index)
+
+    def drop(self, index: int):
+        """Take a cached or failed entry out of the estimate; it needs no download time"""
+        with self._lock:
+            self._active.pop(index, None)
+            self._weights.pop(index, None)
+            self._done.discard(index)
+            self._dropped += 1
+
+    def _snapshot(self) -> dict:
+        known = [w for w in self._weights.values() if w]
+        default = sum(known) / len(known) if known else 1.0
+        unplanned = max(self.expected - len(self._weights) - self._dropped, 0)
+        total = sum(w or default for w in self._weights.values()) + unplanned * default
+        done = sum(self._weights.get(i) or default for i in self._done)
+
+        downloads = []
+        in_flight = 0
+        speed = 0.0
+        for index, entry in sorted(self._active.items()):
+            fraction = None
+            if entry["total_bytes"]:
+                fraction = min(entry["downloaded_bytes"] / entry["total_bytes"], 1.0)
+                done += (self._weights.get(index) or default) * fraction
+            downloads.append({**entry, "percent": round(fraction * 100, 1) if fraction is not None else None})
+            in_flight += entry["downloaded_bytes"]
+            speed += entry["speed"] or 0
+
+        downloaded = self._bytes_done + in_flight
+        elapsed = time.monotonic() - self._started if self._started is not None else 0.0
+        eta = None
+        if elapsed >= 1 and done > 0:
+            eta = max(round((total - done) * elapsed / done), 0)
+        return {
+            "downloads": downloads,
+            "downloaded_bytes": downloaded,
+            "speed": round(speed) if self._active else None,
+            "average_speed": round(downloaded / elapsed) if elapsed >= 1 else None,
+            "eta_seconds": eta,
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot()
+
+    def publish(self, force: bool = False, **fields):
+        """Write the snapshot to the job store, at most once per min_interval unless forced"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_publish < self.min_interval:
+                return
+            self._last_publish = now
+            # Held across the write so a stale snapshot can't land after a newer one
+            update_progress(self.job_id, **fields, **self._snapshot())
+
+
+class ProgressParser:
+    """Folds yt-dlp's JSON event lines into job progress.
+
+    Progress ticks are coalesced: only the latest one is decoded, at most once
+    per min_interval. Entry boundaries, stage changes and errors are written
+    immediately.
+    """
+
+    def __init__(self, job_id: str, min_interval: float = 0.25):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self.state = {
+            "current": 0,
+            "total": 1,
+            "failed": [],
+            "stages": {"download": new_stage_stats(), "transcode": new_stage_stats()},
+        }
+        self.finished = set()
+        self.started = set()
+        # Index, id and title of the entry yt-dlp announced last, until it finishes
+        self._current_entry = None
+        self._last_index = 0
+        self.throughput = JobThroughput(job_id)
+        self._entry_stage = {}
+        self._dirty = False
+        self._last_flush = 0.0
+        self._pending_tick = None
+
+    def feed(self, line: str):
+        if line.startswith(PROGRESS_TICK_PREFIX):
+            self._pending_tick = line
+            self.flush()
+            return
+        if not line.startswith(PROGRESS_MARKER):
+            if line.startswith("ERROR:"):
+                self._apply_pending()
+                failure = {**self._failed_entry(line), "reason": error_reason(line)}
+                self._current_entry = None
+                self.state["failed"] = [*self.state["failed"], failure]
+                self._entry_failed(failure["index"] or 1)
+                logger.error(f"yt-dlp reported: {line.strip()}")
+                self._dirty = True
+                self.flush(force=True)
+            return
+        # Settle the latest tick first so an entry's final byte count lands before it changes stage
+        self._apply_pending()
+        event = self._decode(line)
+        if event is None:
+            return
+
+        state = self.state
+        kind = event.get("event")
+        index = event.get("index") or 1
+        if event.get("n_entries"):
+            state["total"] = event["n_entries"]
+            self.throughput.expect(event["n_entries"])
+        if kind == "start":
+            state["status"] = "downloading"
+            state["current_title"] = event.get("title")
+            state["current_index"] = event.get("index")
+            self._current_entry = {"index": index, "id": event.get("id"), "title": event.get("title")}
+            self._last_index = max(self._last_index, index)
+            self.started.add(index)
+            self.throughput.plan(index, event.get("duration"))
+            self._enter_stage(index, "download")
+        elif kind == "postprocess" and "ExtractAudio" in (event.get("postprocessor") or ""):
+            current = self._entry_stage.get(index, (None,))[0]
+            if event.get("status") == "started" and current == "download":
+                self._enter_stage(index, "transcode")
+            elif event.get("status") == "finished" and current == "transcode":
+                self._enter_stage(index, None)
+        elif kind == "finished" and event.get("filepath"):
+            if self._current_entry and self._current_entry["index"] == index:
+                self._current_entry = None
+            self._enter_stage(index, None)
+            self.finished.add(event["filepath"])
+            state["current"] = len(self.finished)
+            state["total"] = max(state["total"], state["current"])
+            state["files"] = sorted(self.finished)
+            record_entry_id(self.job_id, Path(event["filepath"]), archive_id(event))
+            logger.info(f"Finished entry {index}: {event['filepath']}")
+        self._dirty = True
+        self.flush(force=True)
+
+    def _failed_entry(self, line: str) -> dict:
+        """The entry an ERROR line is about.
+
+        Download and postprocessing errors follow the entry's start event.
+        Extraction errors come before it and name only the video id; the cli
+        engine works through a playlist in order, so that entry is the one
+        after the last announced.
+        """
+        match = re.match(r"ERROR: \[[^\]]+\] ([\w-]+):", line)
+        error_id = match.group(1) if match else None
+        current = self._current_entry
+        if current and (error_id is None or error_id == current["id"]):
+            return dict(current)
+        if error_id is None:
+            return {"index": self.state.get("current_index"), "id": None, "title": None}
+        self._last_index += 1
+        # A flat listing handed over from /metadata still knows the entry's title
+        entries = (load_job_info(self.job_id) or {}).get("entries") or []
+        title = next((e.get("title") for e in entries if isinstance(e, dict) and e.get("id") == error_id), None)
+        return {"index": self._last_index, "id": error_id, "title": title}
+
+    def _enter_stage(self, index: int, stage: Optional[str]):
+        """Close the stage an entry is in and start the next one, if any"""
+        now = time.monotonic()
+        previous = self._entry_stage.pop(index, None)
+        if previous:
+            name, started = previous
+            self._advance(name, "done", now - started)
+            if name == "download":
+                self.throughput.finish(index)
+        if stage:
+            self._advance(stage, "start")
+            self._entry_stage[index] = (stage, now)
+
+    def _entry_failed(self, index: int):
+        previous = self._entry_stage.pop(index, None)
+        if previous:
+            self._advance(previous[0], "failed")
+            self.throughput.drop(index)
+
+    def _advance(self, stage: str, event: str, elapsed: float = 0.0):
+        stages = self.state["stages"]
+        stats = advance_stage(stages.get(stage) or new_stage_stats(), event, elapsed)
+        if stage == "download":
+            # Entries are only announced as yt-dlp reaches them, so queued is derived from the total
+            stats["queued"] = max(self.state["total"] - len(self.started), 0)
+        self.state["stages"] = {**stages, stage: stats}
+
+    def _decode(self, line: str) -> Optional[dict]:
+        try:
+            return json.loads(line[len(PROGRESS_MARKER):])
+        except json.JSONDecodeError:
+            logger.debug(f"Unparseable yt-dlp event: {line.strip()}")
+            return None
+
+    def _apply_tick(self, event: dict):
+        state = self.state
+        if event.get("n_entries"):
+            state["total"] = event["n_entries"]
+            self.throughput.expect(event["n_entries"])
+        state["status"] = "downloading"
+        state["current_title"] = event.get("title")
+        state["current_index"] = event.get("index")
+        self.throughput.update(
+            event.get("index") or 1,
+            event.get("title"),
+            event.get("downloaded_bytes") or 0,
+            event.get("total_bytes") or event.get("total_bytes_estimate"),
+            event.get("speed"),
+        )
+
+    def _apply_pending(self):
+        if self._pending_tick is None:
+            return
+        event = self._decode(self._pending_tick)
+        self._pending_tick = None
+        if event is not None:
+            self._apply_tick(event)
+            self._dirty = True
+
+    def flush(self, force: bool = False):
+        if not self._dirty and self._pending_tick is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.min_interval:
+            return
+        self._apply_pending()
+        job_store.update(self.job_id, **self.state, **self.throughput.snapshot())
+        self._dirty = False
+        self._last_flush = now
+
+
+def run_download_with_progress(job_id: str, playlist_url: str, template: str):
+    """Run the yt-dlp executable and track progress from its JSON event lines"""
+    # Start from the info handed over by /metadata when there is one instead of extracting again
+    source = ["--load-info-json", str(job_info_path(job_id))] if load_job_info(job_id) else [playlist_url]
+    cmd = [
+        "yt-dlp",
+        *source,
+        "-o", template,
+        "--yes-playlist",
+        "--extract-audio",
+        "--audio-format", "mp3",
+        "--ffmpeg-location", FFMPEG_LOCATION,
+        "--progress",
+        "--newline",
+        "--progress-template", f"download:{CLI_PROGRESS_TEMPLATE}",
+        "--progress-template", f"postprocess:{CLI_POSTPROCESS_TEMPLATE}",
+        "--print", f"video:{CLI_START_TEMPLATE}",
+        "--print", f"after_move:{CLI_FINISHED_TEMPLATE}",
+        "--no-simulate",
+        # Keep going past unavailable entries; they are reported as failed
+        "--ignore-errors",
+        # Lets a resumed job skip entries finished before a restart
+        "--download-archive", str(job_archive_path(job_id)),
+    ]
+
+    parser = ProgressParser(job_id, PROGRESS_FLUSH_SECONDS)
+    job_store.update(
+        job_id,
+        status="starting",
+        current_title=None,
+        **parser.state,
+    )
+
+    control = job_control(job_id)
+    control.check()
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        start_new_session=True,
+    )
+    control.register(process)
+
+    for line in process.stdout:
+        parser.feed(line)
+
+    process.wait()
+    control.unregister(process)
+    control.check()
+    parser.flush(force=True)
+
+    if process.returncode != 0 and not parser.state["failed"]:
+        job_store.update(job_id, status="error")
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+    # "completed" is set once the manifest has been built
+    with job_store.edit(job_id) as progress:
+        progress["current"] = len(parser.finished)
+        progress["total"] = max(progress.get("total") or 0, len(parser.finished))
+        progress["status"] = "processing"
+
+
+def ydl_logger():
+    return logging.getLogger("yt_dlp")
+
+
+def expand_playlist(playlist_url: str, info: Optional[dict] = None):
+    """Flat-extract a URL into its entry list without resolving every video.
+
+    A flat info dict already extracted for the URL can be passed to skip the
+    extraction.
+    """
+    if info is None:
+        opts = {
+            "extract_flat": "in_playlist",
+            "skip_download": True,
+            "logger": ydl_logger(),
+            "quiet": True,
+        }
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.extract_info(playlist_url, download=False)
+
+    if info.get("_type") in ("playlist", "multi_video"):
+        entries = [e for e in (info.get("entries") or []) if e]
+    else:
+        entries = [{
+            "_type": "url",
+            "url": info.get("webpage_url") or playlist_url,
+            "ie_key": info.get("extractor_key"),
+            "id": info.get("id"),
+            "title": info.get("title"),
+            "duration": info.get("duration"),
+        }]
+    return info, entries
+
+
+def resolve_concurrency(requested: Optional[int]) -> int:
+    value = requested or DOWNLOAD_CONCURRENCY
+    return max(1, min(value, MAX_DOWNLOAD_CONCURRENCY))
+
+
+def new_stage_stats(queued: int = 0) -> dict:
+    return {"queued": queued, "active": 0, "done": 0, "seconds": 0.0}
+
+
+def advance_stage(stats: dict, event: str, elapsed: float = 0.0) -> dict:
+    """Move one entry through a pipeline stage's queued -> active -> done counters"""
+    stats = dict(stats)
+    if event == "queued":
+        stats["queued"] += 1
+    elif event == "start":
+        stats["queued"] = max(stats["queued"] - 1, 0)
+        stats["active"] += 1
+    elif event == "done":
+        stats["active"] -= 1
+        stats["done"] += 1
+        stats["seconds"] = round(stats["seconds"] + elapsed, 3)
+    elif event == "cached":
+        stats["queued"] -= 1
+        stats["done"] += 1
+        stats["cached"] = stats.get("cached", 0) + 1
+    elif event == "failed":
+        stats["active"] -= 1
+    return stats
+
+
+def stage_event(job_id: str, stage: str, event: str, elapsed: float = 0.0):
+    with job_store.edit(job_id) as job:
+        stages = job.get("stages") or {}
+        job["stages"] = {**stages, stage: advance_stage(stages.get(stage) or new_stage_stats(), event, elapsed)}
+
+
+def stage_progress(stages: Optional[dict], downloads: List[dict]) -> Optional[dict]:
+    """Add a completion percentage to each stage, counting partial downloads by bytes"""
+    if not stages:
+        return stages
+    result = {}
+    for name, stats in stages.items():
+        total = stats.get("queued", 0) + stats.get("active", 0) + stats.get("done", 0)
+        done = stats.get("done", 0)
+        if name == "download":
+            done += sum((d.get("percent") or 0) / 100 for d in downloads)
+        result[name] = {**stats, "percent": round(done * 100 / total, 1) if total else None}
+    return result
+
+
+def archive_id(info: dict) -> Optional[str]:
+    extractor = info.get("extractor_key") or info.get("ie_key")
+    video_id = info.get("id")
+    if not extractor or not video_id:
+        return None
+    return f"{extractor.lower()} {video_id}"
+
+
+def read_archive(path: Path) -> set:
+    try:
+        return {line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def append_archive(path: Path, ids):
+    with archive_lock:
+        known = read_archive(path)
+        new_ids = [i for i in ids if i and i not in known]
+        if not new_ids:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for i in new_ids:
+                f.write(i + "\n")
+
+
+def record_entry_id(job_id: str, track: Path, entry_id: Optional[str]):
+    """Remember which playlist entry a track file came from, for library archives"""
+    if not entry_id:
+        return
+    with job_store.edit(job_id) as progress:
+        progress["entry_ids"] = {**(progress.get("entry_ids") or {}), track.name: entry_id}
+
+
+def archive_library_tracks(job_id: str, library_dir: Path, tracks: List[Path]):
+    """Mark the entries behind tracks copied into the library as done for later syncs"""
+    job = job_store.get(job_id) or {}
+    entry_ids = job.get("entry_ids")
+    if entry_ids is None:
+        # Jobs downloaded before files were mapped to entries: only trust their archive if nothing was left out
+        if len(tracks) < len(job.get("tracks") or []):
+            return
+        ids = read_archive(job_archive_path(job_id))
+    else:
+        ids = {entry_ids[t.name] for t in tracks if t.name in entry_ids}
+    append_archive(library_archive_path(library_dir), sorted(ids))
+
+
+def job_archive_path(job_id: str) -> Path:
+    return JOBS_DIR / job_id / "download-archive.txt"
+
+
+def job_info_path(job_id: str) -> Path:
+    return JOBS_DIR / job_id / "info.json"
+
+
+def load_job_info(job_id: str) -> Optional[dict]:
+    """The flat playlist info handed over from /metadata, if still fresh enough to trust"""
+    path = job_info_path(job_id)
+    try:
+        if time.time() - path.stat().st_mtime > info_tokens.ttl:
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def library_archive_path(album_dir: Path) -> Path:
+    digest = hashlib.sha256(str(album_dir).encode("utf-8")).hexdigest()
+    return ARCHIVES_DIR / f"{digest}.txt"
+
+
+def max_track_number(directory: Path) -> int:
+    numbers = [int(m.group(1)) for p in directory.glob("*.mp3") if (m := re.match(r"^(\d+)", p.name))]
+    return max(numbers, default=0)
+
+
+def link_or_copy(source: Path, dest: Path):
+    """Hardlink source to dest, falling back to a copy across filesystems"""
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copy2(source, dest)
+
+
+def detach_hardlink(path: Path):
+    """Give a file its own inode so in-place tag writes don't leak into linked copies"""
+    if path.stat().st_nlink > 1:
+        tmp = path.with_name(path.name + ".detach")
+        shutil.copy2(path, tmp)
+        os.replace(tmp, path)
+
+
+class AudioCache:
+    """Content-addressed store of finished mp3s shared across jobs.
+
+    Entries are keyed by extractor + video id + output profile and evicted
+    least-recently-used once the cache grows past max_bytes. With a
+    WorkerBoard the index lives in the job database, so every API worker sees
+    the others' entries and max_bytes bounds the cache as a whole.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, board: Optional[WorkerBoard] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.board = board
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(info: dict) -> Optional[str]:
+        extractor = info.get("extractor_key") or info.get("ie_key")
+        video_id = info.get("id")
+        if not extractor or not video_id:
+            return None
+        raw = f"{extractor.lower()}:{video_id}:{AUDIO_PROFILE}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.mp3"
+
+    def _load(self):
+        # Rebuild the LRU order from mtimes, which fetch() bumps on every hit
+        if self._loaded:
+            return
+        self._loaded = True
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.root.glob("*/*.mp3"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, path.stem, st.st_size))
+        if self.board is not None:
+            # Files another worker already indexed keep their recorded use time
+            self.board.cache_seed([(key, size, mtime) for mtime, key, size in files])
+            return
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        logger.info(f"Audio cache loaded: {len(self._entries)} entries, {self._bytes} bytes")
+
+    def _fetch_shared(self, key: str, dest: Path) -> bool:
+        with self._lock:
+            self._load()
+        path = self._path(key)
+        try:
+            link_or_copy(path, dest)
+            os.utime(path)
+        except FileNotFoundError:
+            self.board.cache_remove(key)
+            with self._lock:
+                self.misses += 1
+            return False
+        self.board.cache_touch(key)
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        if not self.enabled:
+            return False
+        if self.board is not None:
+            return self._fetch_shared(key, dest)
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            link_or_copy(path, dest)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, source: Path):
+        if not self.enabled:
+            return
+        size = source.stat().st_size
+        if size > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        link_or_copy(source, tmp)
+        os.replace(tmp, path)
+        if self.board is not None:
+            with self._lock:
+                self._load()
+            evicted = self.board.cache_add(key, size, self.max_bytes)
+            for old_key in evicted:
+                self._path(old_key).unlink(missing_ok=True)
+            with self._lock:
+                self.evictions += len(evicted)
+            return
+        with self._lock:
+            self._load()
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._bytes > self.max_bytes and self._entries:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+                self._path(old_key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        entries, nbytes = self.board.cache_usage() if self.board is not None else (None, None)
+        with self._lock:
+            return {
+                "entries": len(self._entries) if entries is None else entries,
+                "bytes": self._bytes if nbytes is None else nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB * 1024 * 1024, worker_board)
+
+
+class InsufficientStorageError(Exception):
+    pass
+
+
+class DiskBudget:
+    """Reservations of estimated job output against free space on the data volume.
+
+    Free space already reflects what running jobs have written, so each job
+    releases an entry's share of its reservation as that entry finishes.
+    With a WorkerBoard the reservations of every API worker count.
+    """
+
+    def __init__(self, path: Path, headroom_bytes: int, board: Optional[WorkerBoard] = None):
+        self.path = path
+        self.headroom_bytes = headroom_bytes
+        self.board = board
+        self.waits = 0
+        self.rejections = 0
+        self._cond = threading.Condition()
+        self._reservations = {}
+
+    def _budget(self) -> int:
+        return shutil.disk_usage(self.path).free - self.headroom_bytes
+
+    def _reserved(self) -> tuple:
+        if self.board is not None:
+            return self.board.reserved()
+        return sum(self._reservations.values()), len(self._reservations)
+
+    def _available(self, exclude: Optional[str] = None) -> int:
+        reserved = sum(n for job_id, n in self._reservations.items() if job_id != exclude)
+        return self._budget() - reserved
+
+    def _try_reserve(self, job_id: str, nbytes: int) -> bool:
+        if self.board is not None:
+            return self.board.reserve(job_id, nbytes, self._budget())
+        if self._available(exclude=job_id) < nbytes:
+            return False
+        self._reservations[job_id] = nbytes
+        return True
+
+    def available(self) -> int:
+        with self._cond:
+            return self._budget() - self._reserved()[0]
+
+    def reserve(self, job_id: str, nbytes: int, timeout: float = 0.0, control: Optional[JobControl] = None) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._try_reserve(job_id, nbytes):
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                # Space is also freed without a release (janitor, deleted zips, other workers), so re-check periodically
+                self._cond.wait(min(remaining, REMOTE_POLL_SECONDS if self.board is not None else 5.0))
+                if control:
+                    control.check()
+
+    def release(self, job_id: str, nbytes: Optional[int] = None):
+        """Return part of a job's reservation, or all of it when nbytes is None"""
+        with self._cond:
+            if self.board is not None:
+                self.board.release(job_id, nbytes)
+                self._cond.notify_all()
+                return
+            if job_id not in self._reservations:
+                return
+            remaining = self._reservations[job_id] - nbytes if nbytes is not None else 0
+            if remaining > 0:
+                self._reservations[job_id] = remaining
+            else:
+                del self._reservations[job_id]
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            reserved, reservations = self._reserved()
+            return {
+                "reserved_bytes": reserved,
+                "reservations": reservations,
+                "available_bytes": self._budget() - reserved,
+                "headroom_bytes": self.headroom_bytes,
+                "waits": self.waits,
+                "rejections": self.rejections,
+            }
+
+
+disk_budget = DiskBudget(DATA_DIR, DISK_HEADROOM_MB * 1024 * 1024, worker_board)
+
+
+def estimate_sizes(entries: List[dict]) -> List[int]:
+    """Expected bytes on disk per entry, from its duration; unknown durations count as the mean known one"""
+    known = [e["duration"] for e in entries if e.get("duration")]
+    fallback = sum(known) / len(known) if known else ADMISSION_DEFAULT_TRACK_SECONDS
+    rate = ADMISSION_KBPS * 1000 / 8 * ADMISSION_SOURCE_FACTOR
+    return [int((e.get("duration") or fallback) * rate) for e in entries]
+
+
+def admit_job(job_id: str, needed: int, control: JobControl):
+    """Reserve disk space for a job, waiting for it if the volume is currently too full"""
+    if not DISK_ADMISSION or needed <= 0:
+        return
+    if disk_budget.reserve(job_id, needed):
+        return
+    if needed > shutil.disk_usage(DATA_DIR).total - disk_budget.headroom_bytes:
+        disk_budget.rejections += 1
+        raise InsufficientStorageError(f"Job needs about {needed // 2**20} MB, more than the data volume can hold")
+    disk_budget.waits += 1
+    logger.warning(f"Job {job_id} needs ~{needed // 2**20} MB, waiting up to {ADMISSION_WAIT_SECONDS:.0f}s for disk space")
+    update_progress(job_id, status="waiting_for_space", reserved_bytes=needed)
+    # Smaller jobs behind this one keep running while it waits
+    with job_scheduler.slot_released(job_id):
+        # Failing inside the block gives up the job without taking a slot back first
+        if not disk_budget.reserve(job_id, needed, ADMISSION_WAIT_SECONDS, control):
+            disk_budget.rejections += 1
+            available = max(disk_budget.available(), 0)
+            raise InsufficientStorageError(
+                f"Not enough disk space: job needs about {needed // 2**20} MB, {available // 2**20} MB available"
+            )
+
+
+def retry_delay(attempt: int) -> float:
+    cap = min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(cap / 2, cap)
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """yt-dlp marks errors like unavailable or private videos as expected; retrying won't help"""
+    cause = error
+    exc_info = getattr(error, "exc_info", None)
+    if exc_info and exc_info[1] is not None:
+        cause = exc_info[1]
+    return isinstance(cause, yt_dlp.utils.ExtractorError) and bool(cause.expected)
+
+
+def error_reason(error: Exception) -> str:
+    return re.sub(r"^ERROR:\s*", "", str(error)).strip() or type(error).__name__
+
+
+def transcode_to_mp3(source: Path, control: Optional[JobControl] = None) -> Path:
+    """Encode a downloaded audio stream to mp3 next to it and remove the source"""
+    target = source.with_suffix(".mp3")
+    if source.suffix.lower() == ".mp3":
+        return source
+    tmp = target.with_name(target.name + ".tmp")
+    cmd = [
+        FFMPEG_LOCATION,
+        "-y", "-nostdin", "-loglevel", "error",
+        "-i", str(source),
+        "-vn", "-codec:a", "libmp3lame", "-q:a", MP3_QUALITY,
+        "-f", "mp3", str(tmp),
+    ]
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, start_new_session=True
+    )
+    if control:
+        control.register(proc)
+    try:
+        _, stderr = proc.communicate()
+    finally:
+        if control:
+            control.unregister(proc)
+    if proc.returncode != 0:
+        tmp.unlink(missing_ok=True)
+        if control:
+            control.check()
+        detail = (stderr or "").strip() or f"ffmpeg exited with {proc.returncode}"
+        raise RuntimeError(f"Transcode failed for {source.name}: {detail}")
+    tmp.replace(target)
+    source.unlink(missing_ok=True)
+    return target
+
+
+def run_download_in_process(
+    job_id: str,
+    playlist_url: str,
+    template: str,
+    concurrency: Optional[int] = None,
+    archive: Optional[Path] = None,
+    append_after: Optional[int] = None,
+    skip_archive: Optional[Path] = None,
+):
+    """Run yt-dlp in-process through the YoutubeDL API and track progress via its hooks.
+
+    The playlist is flat-extracted first. Entries then flow through two stages:
+    a per-job download pool fetching bestaudio sources, and the shared
+    transcode pool running ffmpeg, so encoding track k overlaps downloading k+1.
+
+    Entries already listed in the download archive, or in skip_archive, are
+    skipped; finished ones are only added to the former. With
+    append_after set, the remaining entries are numbered after that track
+    instead of by playlist position.
+    """
+    update_progress(
+        job_id,
+        current=0,
+        total=1,
+        status="starting",
+        current_title=None,
+        downloads=[],
+        downloaded_bytes=0,
+        speed=None,
+        average_speed=None,
+        eta_seconds=None,
+        files=[],
+    )
+
+    _, entries = expand_playlist(playlist_url, load_job_info(job_id))
+    numbered = list(enumerate(entries, start=1))
+    if archive:
+        done_ids = read_archive(archive) | (read_archive(skip_archive) if skip_archive else set())
+        numbered = [(i, e) for i, e in numbered if archive_id(e) not in done_ids]
+        if append_after is not None:
+            numbered = [(append_after + k, e) for k, (_, e) in enumerate(numbered, start=1)]
+        logger.info(f"{len(entries) - len(numbered)} of {len(entries)} entries already in {archive.name}")
+    # A resumed job counts what it finished before the restart; an appending sync only counts new entries
+    already_done = len(entries) - len(numbered) if append_after is None else 0
+    existing_files = {str(p) for p in (JOBS_DIR / job_id).glob("*.mp3")}
+    entries = [e for _, e in numbered]
+    workers = min(resolve_concurrency(concurrency), max(len(entries), 1))
+    control = job_control(job_id)
+    sizes = dict(zip((i for i, _ in numbered), estimate_sizes(entries)))
+    admit_job(job_id, sum(sizes.values()), control)
+    update_progress(
+        job_id,
+        current=already_done,
+        total=already_done + len(entries),
+        status="downloading",
+        files=sorted(existing_files),
+        failed=[],
+        stages={"download": new_stage_stats(len(entries)), "transcode": new_stage_stats()},
+    )
+    logger.info(f"Expanded {playlist_url} into {len(entries)} entries, downloading with {workers} workers")
+
+    throughput = JobThroughput(job_id, len(entries), PROGRESS_FLUSH_SECONDS)
+    for index, entry in numbered:
+        throughput.plan(index, entry.get("duration"))
+
+    finished_files = set()
+    transcode_futures = []
+    futures_lock = threading.Lock()
+
+    def on_progress(d):
+        # Raising from a hook aborts the in-flight yt-dlp download
+        control.check()
+        info = d.get("info_dict") or {}
+        throughput.update(
+            info.get("playlist_index"),
+            info.get("title"),
+            d.get("downloaded_bytes") or 0,
+            d.get("total_bytes") or d.get("total_bytes_estimate"),
+            d.get("speed"),
+        )
+        throughput.publish(current_title=info.get("title"))
+
+    ydl_opts = {
+        "outtmpl": template,
+        "format": "bestaudio/best",
+        # yt-dlp's own merging and fixup postprocessors use the configured ffmpeg too
+        "ffmpeg_location": FFMPEG_LOCATION,
+        "progress_hooks": [on_progress],
+        "logger": ydl_logger(),
+        "quiet": True,
+        "noprogress": True,
+    }
+
+    # Only used to render cache hits to the same filename yt-dlp would have produced
+    namer = yt_dlp.YoutubeDL({"outtmpl": template, "logger": ydl_logger(), "quiet": True})
+
+    def record_finished(index: int, target: Path, entry_id: Optional[str]):
+        # The file now shows up in free space, so its share of the reservation is returned
+        disk_budget.release(job_id, sizes.get(index, 0))
+        if archive and entry_id:
+            append_archive(archive, [entry_id])
+        record_entry_id(job_id, target, entry_id)
+        with job_store.edit(job_id) as progress:
+            finished_files.add(str(target))
+            progress["current"] = already_done + len(finished_files)
+            progress["files"] = sorted(existing_files | finished_files)
+        logger.info(f"Finished entry {index}: {target}")
+
+    def record_failed(index: int, entry: dict, error: Exception, attempts: int):
+        failure = {
+            "index": index,
+            "id": entry.get("id"),
+            "title": entry.get("title"),
+            "reason": error_reason(error),
+            "attempts": attempts,
+        }
+        disk_budget.release(job_id, sizes.get(index, 0))
+        with job_store.edit(job_id) as progress:
+            progress["failed"] = [*(progress.get("failed") or []), failure]
+        logger.error(f"Giving up on entry {index} ({entry.get('id')}) after {attempts} attempt(s): {failure['reason']}")
+
+    def transcode_entry(index: int, entry: dict, source: Path, cache_key: Optional[str], entry_id: Optional[str]):
+        control.check()
+        stage_event(job_id, "transcode", "start")
+        started = time.monotonic()
+        try:
+            target = transcode_to_mp3(source, control)
+        except JobCancelled:
+            raise
+        except Exception as e:
+            # ffmpeg failures are deterministic, so the entry fails without a retry
+            stage_event(job_id, "transcode", "failed")
+            control.check()
+            record_failed(index, entry, e, 1)
+            return
+        stage_event(job_id, "transcode", "done", time.monotonic() - started)
+        if cache_key:
+            try:
+                audio_cache.store(cache_key, target)
+            except OSError as e:
+                logger.warning(f"Could not add {target.name} to audio cache: {e}")
+        record_finished(index, target, entry_id)
+
+    def download_entry(index: int, entry: dict):
+        control.check()
+        cache_key = AudioCache.make_key(entry)
+        if cache_key and entry.get("title"):
+            target = Path(namer.prepare_filename({**entry, "playlist_index": index, "ext": "mp3"}))
+            if audio_cache.fetch(cache_key, target):
+                stage_event(job_id, "download", "cached")
+                throughput.drop(index)
+                throughput.publish(force=True)
+                record_finished(index, target, archive_id(entry))
+                return
+
+        url = entry.get("url") or entry.get("webpage_url") or entry.get("id")
+        stage_event(job_id, "download", "start")
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                # The entry is extracted on its own, so pin its playlist position for the output template
+                with yt_dlp.YoutubeDL(dict(ydl_opts)) as ydl:
+                    info = ydl.extract_info(url, ie_key=entry.get("ie_key"), extra_info={"playlist_index": index})
+                source = Path(info["requested_downloads"][0]["filepath"])
+                break
+            except Exception as e:
+                control.check()
+                if attempt > DOWNLOAD_RETRIES or is_permanent_error(e):
+                    stage_event(job_id, "download", "failed")
+                    throughput.drop(index)
+                    throughput.publish(force=True)
+                    record_failed(index, entry, e, attempt)
+                    return
+                throughput.reset(index)
+                delay = retry_delay(attempt)
+                logger.warning(f"Entry {index} failed on attempt {attempt}, retrying in {delay:.1f}s: {error_reason(e)}")
+                control.cancelled.wait(delay)
+        stage_event(job_id, "download", "done", time.monotonic() - started)
+        throughput.finish(index)
+        throughput.publish(force=True)
+        stage_event(job_id, "transcode", "queued")
+        future = transcode_pool.submit(
+            transcode_entry, index, entry, source, AudioCache.make_key(info) or cache_key, archive_id(info) or archive_id(entry)
+        )
+        with futures_lock:
+            transcode_futures.append(future)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"dl-{job_id[:8]}") as pool:
+        futures = [pool.submit(download_entry, i, e) for i, e in numbered]
+        try:
+            for future in as_completed(futures):
+                future.result()
+            for future in as_completed(transcode_futures):
+                future.result()
+        except Exception:
+            for future in futures + transcode_futures:
+                future.cancel()
+            if not control.cancelled.is_set():
+                update_progress(job_id, status="error")
+            raise
+
+    throughput.publish(force=True)
+    with job_store.edit(job_id) as progress:
+        progress["current"] = already_done + len(finished_files)
+        progress["total"] = progress["current"] or progress["total"]
+        progress["status"] = "processing"
+
+
+def process_download_async(
+    job_id: str,
+    playlist_url: str,
+    template: str,
+    concurrency: Optional[int] = None,
+    sync: Optional[str] = None,
+    album: Optional[AlbumMeta] = None,
+):
+    """Process download in background thread"""
+    job_dir = JOBS_DIR / job_id
+    control = job_control(job_id)
+    try:
+        control.check()
+        if DOWNLOAD_ENGINE == "cli":
+            if DISK_ADMISSION:
+                # The cli engine never expands the playlist itself, so this listing is only for the estimate
+                _, entries = expand_playlist(playlist_url, load_job_info(job_id))
+                done_ids = read_archive(job_archive_path(job_id))
+                admit_job(job_id, sum(estimate_sizes([e for e in entries if archive_id(e) not in done_ids])), control)
+            run_download_with_progress(job_id, playlist_url, template)
+        elif sync == "library":
+            album_dir = library_album_dir(sanitize(album.artist), sanitize(album.title))
+            # Entries reach the library archive only once sync_to_library has copied their tracks
+            run_download_in_process(
+                job_id, playlist_url, template, concurrency,
+                archive=job_archive_path(job_id),
+                append_after=max_track_number(album_dir) if album_dir.exists() else 0,
+                skip_archive=library_archive_path(album_dir),
+            )
+        else:
+            run_download_in_process(
+                job_id, playlist_url, template, concurrency,
+                archive=job_archive_path(job_id),
+                append_after=max_track_number(job_dir) if sync == "job" else None,
+            )
+        logger.info(f"yt-dlp completed successfully for job {job_id}")
+        
+        # Build manifest
+        logger.info("Building track manifest...")
+        mp3s = sorted(p for p in job_dir.glob("*.mp3"))
+        logger.info(f"Found {len(mp3s)} MP3 files")
+        
+        # Store tracks in progress store for retrieval
+        tracks = []
+        for i, p in enumerate(mp3s, start=1):
+            title = p.stem
+            # Strip leading number prefix and dash if present
+            # For playlists: "01 - Title" -> "Title"
+            # For single videos: "00 - Title" -> "Title" or " - Title" -> "Title"
+            # Handle both numbered prefix and plain dash prefix
+            title = re.sub(r"^\d+\s*-\s*", "", title)  # Remove "01 - " or "00 - " prefix
+            title = re.sub(r"^\s*-\s*", "", title)  # Remove " - " prefix if present (single videos)
+            tracks.append({"id": i, "path": str(p), "title": title})
+            logger.debug(f"Track {i}: {title}")
+
+        if sync == "library" and tracks:
+            library_dir = sync_to_library(job_id, album, tracks)
+            update_progress(job_id, library_path=str(library_dir))
+
+        # Entries that failed for good don't sink the job as long as something was downloaded
+        failed = (job_store.get(job_id) or {}).get("failed") or []
+        if failed and not tracks:
+            raise RuntimeError(f"All {len(failed)} entries failed: {failed[0]['reason']}")
+        status = "completed_with_errors" if failed else "completed"
+        job_store.update(job_id, tracks=tracks, status=status)
+
+        logger.info(f"Download job {job_id} finished as {status} with {len(tracks)} tracks, {len(failed)} failed")
+    except Exception as e:
+        if control.cancelled.is_set():
+            logger.info(f"Download job {job_id} cancelled")
+            remove_partial_files(job_dir)
+            job_store.update(job_id, status="cancelled")
+        else:
+            logger.error(f"Download failed for job {job_id}: {e}")
+            job_store.update(job_id, status="error", error=str(e))
+    finally:
+        disk_budget.release(job_id)
+        release_job_control(job_id)
+
+
+# Audio containers yt-dlp may fetch as bestaudio before they are transcoded to mp3
+SOURCE_AUDIO_SUFFIXES = {".webm", ".m4a", ".mp4", ".opus", ".ogg", ".oga", ".aac", ".flac", ".wav", ".mka"}
+
+
+def is_partial_file(path: Path) -> bool:
+    """yt-dlp partial downloads and resume state, untranscoded sources and unfinished mp3 encodes"""
+    suffix = path.suffix.lower()
+    return (
+        suffix in (".part", ".ytdl")
+        or suffix.startswith(".part-frag")
+        or suffix in SOURCE_AUDIO_SUFFIXES
+        or path.name.endswith(".mp3.tmp")
+    )
+
+
+def remove_partial_files(job_dir: Path):
+    """Delete in-flight download artifacts; job state such as job.json and info.json is kept"""
+    if not job_dir.is_dir():
+        return
+    for path in job_dir.iterdir():
+        if path.is_file() and is_partial_file(path):
+            path.unlink(missing_ok=True)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobScheduler:
+    """Runs download jobs on a fixed set of worker threads and queues the rest.
+
+    Jobs are ordered by priority (higher first) and FIFO within a priority.
+    A running job that has to block for a long time (waiting for disk space)
+    can hand its slot to the queue and take it back, ahead of queued jobs,
+    when it is ready to continue. With a WorkerBoard, slots, the queue limit
+    and queue order are shared by every API worker; each worker still runs
+    its own jobs.
+    """
+
+    def __init__(self, max_running: int, max_queued: int, board: Optional[WorkerBoard] = None):
+        self.max_running = max(1, max_running)
+        self.max_queued = max(0, max_queued)
+        # With a board the limits and queue order hold across all API workers
+        self.board = board
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._running = set()
+        # Jobs that gave their slot up while blocked, and those waiting to get it back
+        self._yielded = set()
+        self._reclaiming = set()
+        self._workers = []
+
+    def submit(self, job_id: str, target, args: tuple, priority: int = 0, force: bool = False):
+        with self._cond:
+            if self.board is not None:
+                if not self.board.enqueue(job_id, priority, self.max_queued, self.max_running, force):
+                    raise QueueFullError(job_id)
+            else:
+                # Jobs that gave their slot up are still waiting for one, like queued jobs
+                waiting = len(self._queue) + len(self._yielded)
+                if not force and waiting >= self.max_queued and len(self._running) >= self.max_running:
+                    raise QueueFullError(job_id)
+            heapq.heappush(self._queue, (-priority, next(self._seq), job_id, target, args))
+            self._ensure_workers()
+            self._cond.notify_all()
+
+    def remove(self, job_id: str) -> bool:
+        """Drop a job that has not started yet"""
+        with self._cond:
+            for i, item in enumerate(self._queue):
+                if item[2] == job_id:
+                    self._queue.pop(i)
+                    heapq.heapify(self._queue)
+                    if self.board is not None:
+                        self.board.remove(job_id)
+                    return True
+        return False
+
+    def is_running(self, job_id: str) -> bool:
+        with self._cond:
+            return job_id in self._running or job_id in self._yielded
+
+    @contextmanager
+    def slot_released(self, job_id: str):
+        """Let a queued job use this job's slot while the block runs"""
+        with self._cond:
+            if job_id not in self._running:
+                owned = False
+            else:
+                owned = True
+                self._running.discard(job_id)
+                self._yielded.add(job_id)
+                if self.board is not None:
+                    self.board.set_state(job_id, "yielded")
+                # This job's thread stays blocked, so another one picks up the freed slot
+                self._ensure_workers()
+                self._cond.notify_all()
+        if not owned:
+            yield
+            return
+        try:
+            yield
+        except BaseException:
+            # A job that fails or is cancelled while waiting only cleans up, without a slot
+            with self._cond:
+                self._yielded.discard(job_id)
+            raise
+        with self._cond:
+            self._reclaiming.add(job_id)
+            if self.board is not None:
+                self.board.set_state(job_id, "reclaiming")
+            while len(self._running) >= self.max_running or (
+                self.board is not None and not self.board.reclaim(job_id, self.max_running)
+            ):
+                # Slots freed by other workers don't notify this one
+                self._cond.wait(REMOTE_POLL_SECONDS if self.board is not None else None)
+            self._reclaiming.discard(job_id)
+            self._yielded.discard(job_id)
+            self._running.add(job_id)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of a queued job, or None if it is not waiting"""
+        if self.board is not None:
+            # Answers for jobs queued on any worker
+            return self.board.position(job_id)
+        with self._cond:
+            ordered = sorted(self._queue)
+        for pos, item in enumerate(ordered, start=1):
+            if item[2] == job_id:
+                return pos
+        return None
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = {
+                "running": len(self._running),
+                "yielded": len(self._yielded),
+                "queued": len(self._queue),
+                "max_running": self.max_running,
+                "max_queued": self.max_queued,
+            }
+        if self.board is not None:
+            stats["all_workers"] = {k: v for k, v in self.board.stats().items() if k in ("running", "yielded", "queued")}
+        return stats
+
+    def _has_free_slot(self) -> bool:
+        return len(self._running) + len(self._reclaiming) < self.max_running
+
+    def _ensure_workers(self):
+        while len(self._workers) < self.max_running + len(self._yielded):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"job-worker-{len(self._workers) + 1}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue or not self._has_free_slot():
+                    self._cond.wait()
+                if self.board is not None and not self.board.acquire(self._queue[0][2], self.max_running):
+                    # The shared slots are taken or a job queued on another worker goes first
+                    self._cond.wait(REMOTE_POLL_SECONDS)
+                    continue
+                _, _, job_id, target, args = heapq.heappop(self._queue)
+                self._running.add(job_id)
+            try:
+                target(*args)
+            except Exception as e:
+                logger.error(f"Job {job_id} crashed in scheduler worker: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+                    if self.board is not None:
+                        self.board.remove(job_id)
+                    self._cond.notify_all()
+
+
+job_scheduler = JobScheduler(MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS, worker_board)
+
+
+def dir_usage(path: Path) -> tuple:
+    """Total size and newest mtime of the files under path"""
+    size = 0
+    newest = path.stat().st_mtime
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            size += st.st_size
+            newest = max(newest, st.st_mtime)
+    return size, newest
+
+
+class Janitor:
+    """Deletes old job work dirs, zips and covers so the data volume doesn't fill up.
+
+    A sweep applies retention ages, then per-directory size caps, then the
+    free-space watermarks, always evicting the least recently used artifacts
+    first. Active jobs and anything used within the grace period are kept.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.reclaimed_bytes = 0
+        self.deleted_jobs = 0
+        self.deleted_zips = 0
+        self.deleted_covers = 0
+        self.last_run = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Janitor sweep failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    @staticmethod
+    def _job_busy(job_id: str) -> bool:
+        job = job_store.peek(job_id) or {}
+        return (
+            job.get("status") in ACTIVE_STATUSES
+            or job_scheduler.is_running(job_id)
+            or job_scheduler.position(job_id) is not None
+        )
+
+    def _artifacts(self, now: float) -> List[dict]:
+        artifacts = []
+        referenced = set()
+        for path in JOBS_DIR.iterdir():
+            if not path.is_dir():
+                continue
+            try:
+                size, newest = dir_usage(path)
+            except FileNotFoundError:
+                continue
+            job = job_store.peek(path.name) or {}
+            last_used = max(newest, job.get("finalized_at") or 0)
+            if job.get("cover_id"):
+                referenced.add(job["cover_id"])
+            artifacts.append({
+                "kind": "job",
+                "path": path,
+                "size": size,
+                "last_used": last_used,
+                "protected": self._job_busy(path.name) or now - last_used < JANITOR_GRACE_SECONDS,
+            })
+        for path in OUT_DIR.glob("*.zip"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            artifacts.append({
+                "kind": "zip",
+                "path": path,
+                "size": st.st_size,
+                "last_used": st.st_mtime,
+                "protected": now - st.st_mtime < JANITOR_GRACE_SECONDS,
+            })
+        for path in COVERS_DIR.glob("*/*.jpg"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            # CoverStore bumps the mtime whenever a cover is reused or served
+            artifacts.append({
+                "kind": "cover",
+                "path": path,
+                "size": st.st_size,
+                "last_used": st.st_mtime,
+                "protected": path.stem in referenced or now - st.st_mtime < JANITOR_GRACE_SECONDS,
+            })
+        return artifacts
+
+    def _delete(self, artifact: dict, why: str) -> int:
+        path = artifact["path"]
+        if artifact["kind"] == "job":
+            # The job may have been picked up again by a sync since the scan
+            if self._job_busy(path.name):
+                artifact["protected"] = True
+                return 0
+            shutil.rmtree(path, ignore_errors=True)
+            job_store.delete(path.name)
+            self.deleted_jobs += 1
+        elif artifact["kind"] == "cover":
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+            self.deleted_covers += 1
+        else:
+            path.unlink(missing_ok=True)
+            self.deleted_zips += 1
+        artifact["deleted"] = True
+        self.reclaimed_bytes += artifact["size"]
+        logger.info(f"Janitor removed {path} ({artifact['size']} bytes, {why})")
+        return artifact["size"]
+
+    def run_once(self) -> int:
+        with self._lock:
+            now = time.time()
+            artifacts = self._artifacts(now)
+            reclaimed = 0
+
+            def candidates(kind: Optional[str] = None):
+                eligible = [
+                    a for a in artifacts
+                    if not a["protected"] and not a.get("deleted") and kind in (None, a["kind"])
+                ]
+                return sorted(eligible, key=lambda a: a["last_used"])
+
+            retention = {
+                "job": JOBS_RETENTION_HOURS * 3600,
+                "zip": OUT_RETENTION_HOURS * 3600,
+                "cover": COVERS_RETENTION_HOURS * 3600,
+            }
+            for artifact in candidates():
+                max_age = retention[artifact["kind"]]
+                if max_age and now - artifact["last_used"] > max_age:
+                    reclaimed += self._delete(artifact, "expired")
+
+            for kind, cap_mb in (("job", JOBS_DIR_MAX_MB), ("zip", OUT_DIR_MAX_MB), ("cover", COVERS_DIR_MAX_MB)):
+                if not cap_mb:
+                    continue
+                total = sum(a["size"] for a in artifacts if a["kind"] == kind and not a.get("deleted"))
+                for artifact in candidates(kind):
+                    if total <= cap_mb * 1024 * 1024:
+                        break
+                    freed = self._delete(artifact, "over size cap")
+                    reclaimed += freed
+                    total -= freed
+
+            if JANITOR_FREE_LOW_MB:
+                low = JANITOR_FREE_LOW_MB * 1024 * 1024
+                high = max(JANITOR_FREE_HIGH_MB, JANITOR_FREE_LOW_MB) * 1024 * 1024
+                free = shutil.disk_usage(DATA_DIR).free
+                if free < low:
+                    for artifact in candidates():
+                        if free >= high:
+                            break
+                        reclaimed += self._delete(artifact, "low disk space")
+                        free = shutil.disk_usage(DATA_DIR).free
+                    if free < low:
+                        logger.warning(f"Free space on {DATA_DIR} still below low watermark: {free} bytes")
+
+            self.last_run = now
+            return reclaimed
+
+    def stats(self) -> dict:
+        return {
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "deleted_jobs": self.deleted_jobs,
+            "deleted_zips": self.deleted_zips,
+            "deleted_covers": self.deleted_covers,
+            "last_run": self.last_run,
+            "free_bytes": shutil.disk_usage(DATA_DIR).free,
+        }
+
+
+janitor = Janitor(JANITOR_INTERVAL_SECONDS)
+
+
+def pick_thumbnail(payload: dict, target_px: int) -> Optional[str]:
+    """Smallest thumbnail whose short side reaches target_px, else the largest one.
+
+    Thumbnails without dimensions are only used when none have them.
+    """
+    thumbnails = [t for t in (payload.get("thumbnails") or []) if isinstance(t, dict) and t.get("url")]
+    sized = [t for t in thumbnails if t.get("width") and t.get("height")]
+    if sized:
+        big_enough = [t for t in sized if min(t["width"], t["height"]) >= target_px]
+        if big_enough:
+            return min(big_enough, key=lambda t: t["width"] * t["height"])["url"]
+        return max(sized, key=lambda t: t["width"] * t["height"])["url"]
+    if payload.get("thumbnail"):
+        return payload["thumbnail"]
+    return thumbnails[-1]["url"] if thumbnails else None
+
+
+def fetch_cover(url: Optional[str]) -> Optional[bytes]:
+    if not url:
+        return None
+
+    headers = {"User-Agent": "Mozilla/5.0 Playlist2Album/1.0"}
+    req = urllib_request.Request(url, headers=headers)
+    limit = COVER_FETCH_MAX_MB * 1024 * 1024
+    try:
+        with urllib_request.urlopen(req, timeout=10) as response:
+            content_type = response.headers.get("Content-Type", "")
+            if not content_type.startswith("image/"):
+                return None
+            data = response.read(limit + 1)
+            if len(data) > limit:
+                logger.warning(f"Skipping thumbnail larger than {COVER_FETCH_MAX_MB} MB: {url}")
+                return None
+            return data
+    except (URLError, HTTPError, TimeoutError, ValueError) as e:
+        logger.warning(f"Could not fetch thumbnail for metadata prefill: {e}")
+        return None
+
+
+def normalize_cover(data: bytes, target_px: int = COVER_TARGET_PX, max_bytes: int = COVER_MAX_KB * 1024) -> bytes:
+    """Center-crop an image to a square of at most target_px and encode it as a JPEG under max_bytes.
+
+    Square JPEGs already within both bounds are returned untouched so
+    re-normalizing a cover doesn't degrade it. Without Pillow the image is
+    returned as given.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return data
+    from io import BytesIO
+
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"not a readable image: {e}")
+    if image.format == "JPEG" and image.width == image.height <= target_px and len(data) <= max_bytes:
+        return data
+
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    side = min(image.width, image.height)
+    left = (image.width - side) // 2
+    top = (image.height - side) // 2
+    image = image.crop((left, top, left + side, top + side))
+    size = min(side, target_px)
+    while True:
+        resized = image.resize((size, size), Image.LANCZOS) if size != side else image
+        for quality in (90, 80, 70, 60, 50):
+            out = BytesIO()
+            resized.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+            if out.tell() <= max_bytes:
+                return out.getvalue()
+        if size <= 64:
+            return out.getvalue()
+        size = int(size * 0.8)
+
+
+class CoverStore:
+    """Normalized covers stored once on disk, keyed by the hash of their bytes.
+
+    Recently normalized sources are remembered by their own hash so the same
+    upload or thumbnail isn't re-encoded.
+    """
+
+    def __init__(self, root: Path, max_sources: int = 256):
+        self.root = root
+        self.max_sources = max_sources
+        self.stored = 0
+        self.reused = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, cover_id: str) -> Path:
+        return self.root / cover_id[:2] / f"{cover_id}.jpg"
+
+    @staticmethod
+    def touch(path: Path):
+        """Mark a cover as used so the janitor keeps it for another retention period"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def put(self, data: bytes) -> Tuple[str, bytes]:
+        """Normalize and store a cover; returns its ID and the normalized bytes"""
+        source = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            cover_id = self._sources.get(source)
+            if cover_id is not None:
+                self._sources.move_to_end(source)
+        if cover_id is not None:
+            try:
+                normalized = self.path(cover_id).read_bytes()
+                self.touch(self.path(cover_id))
+                self.reused += 1
+                return cover_id, normalized
+            except FileNotFoundError:
+                pass
+
+        normalized = normalize_cover(data)
+        cover_id = hashlib.sha256(normalized).hexdigest()
+        path = self.path(cover_id)
+        if path.exists():
+            self.touch(path)
+            self.reused += 1
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # The source size lets finalizing by ID still report what normalizing saved
+            path.with_suffix(".json").write_text(json.dumps({"source_bytes": len(data)}), encoding="utf-8")
+            tmp = path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+            tmp.write_bytes(normalized)
+            tmp.replace(path)
+            self.stored += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(normalized)
+        with self._lock:
+            self._sources[source] = cover_id
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return cover_id, normalized
+
+    def get(self, cover_id: str) -> Optional[Tuple[bytes, int]]:
+        """A stored cover's bytes and the size of the image it was normalized from"""
+        path = self.path(cover_id)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        self.touch(path)
+        try:
+            source_bytes = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))["source_bytes"]
+        except (OSError, ValueError, KeyError):
+            source_bytes = len(data)
+        return data, source_bytes
+
+    def stats(self) -> dict:
+        return {
+            "stored": self.stored,
+            "reused": self.reused,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+
+cover_store = CoverStore(COVERS_DIR)
+
+
+def image_mime(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def cover_id_from_url(cover_url: str) -> str:
+    match = re.search(r"/covers/([0-9a-f]{64})/?$", urlsplit(cover_url).path)
+    if not match:
+        raise HTTPException(status_code=400, detail="cover_url must point at a cover from /covers")
+    return match.group(1)
+
+
+def request_cover_id(req: FinalizeReq) -> Optional[str]:
+    return req.cover_id or (cover_id_from_url(req.cover_url) if req.cover_url else None)
+
+
+def album_cover(req: FinalizeReq) -> Tuple[Optional[bytes], int]:
+    """The cover to embed for a finalize request and the size of its original image"""
+    cover_id = request_cover_id(req)
+    if not cover_id:
+        return decode_cover(req.cover_base64)
+    stored = cover_store.get(cover_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="cover not found")
+    logger.info(f"Using stored cover {cover_id} ({len(stored[0])} bytes)")
+    return stored
+
+
+def decode_cover(cover_base64: Optional[str]) -> Tuple[Optional[bytes], int]:
+    """Decode and normalize a request's cover; returns the bytes to embed and the original size"""
+    if not cover_base64:
+        logger.info("No cover image provided")
+        return None, 0
+    try:
+        original = base64.b64decode(cover_base64)
+        _, cover = cover_store.put(original)
+    except Exception as e:
+        logger.error(f"Failed to decode cover image: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid cover image: {e}")
+    logger.info(f"Cover image normalized from {len(original)} to {len(cover)} bytes")
+    return cover, len(original)
+
+
+async def kill_process_group_async(proc: asyncio.subprocess.Process, grace: float = 5.0):
+    """SIGTERM an asyncio child's process group, then SIGKILL"""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=grace)
+            return
+        except asyncio.TimeoutError:
+            continue
+
+
+class MetadataRunner:
+    """Runs yt-dlp metadata extractions without tying up request threads.
+
+    A semaphore bounds concurrent extractions; each one is killed on timeout
+    or as soon as its client disconnects.
+    """
+
+    def __init__(self, concurrency: int, timeout: float):
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self.disconnects = 0
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(self, cmd: List[str], request: Request) -> bytes:
+        deadline = time.monotonic() + self.timeout
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(status_code=503, detail="Too many metadata requests in progress, try again later")
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        proc = None
+        communicate = None
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+            communicate = asyncio.ensure_future(proc.communicate())
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise HTTPException(status_code=504, detail="Metadata extraction timed out")
+                done, _ = await asyncio.wait({communicate}, timeout=min(remaining, 1.0))
+                if done:
+                    break
+                if await request.is_disconnected():
+                    self.disconnects += 1
+                    logger.info(f"Client went away, stopping metadata extraction for {cmd[-1]}")
+                    raise HTTPException(status_code=499, detail="Client closed request")
+            stdout, stderr = communicate.result()
+        finally:
+            if proc is not None and proc.returncode is None:
+                await kill_process_group_async(proc)
+            if communicate is not None and not communicate.done():
+                communicate.cancel()
+            self.running -= 1
+            self._slots.release()
+
+        if proc.returncode != 0:
+            detail = (stderr or stdout or b"").decode("utf-8", "replace").strip() or "Failed to fetch metadata"
+            raise HTTPException(status_code=400, detail=detail)
+        return stdout
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "timeouts": self.timeouts,
+            "disconnects": self.disconnects,
+        }
+
+
+metadata_runner = MetadataRunner(METADATA_CONCURRENCY, METADATA_TIMEOUT_SECONDS)
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL so tracking and position variants share one cache key."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in URL_IGNORED_PARAMS and not k.startswith("utm_")
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(((parts.scheme or "https").lower(), host, path, urlencode(query), ""))
+
+
+class MetadataCache:
+    """TTL + LRU cache of /metadata responses with per-key singleflight.
+
+    Concurrent misses for one key share a single load; failed loads are not
+    cached. With a persist dir, entries are also written as JSON files and
+    reloaded on first use after a restart.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, persist_dir: Optional[Path] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.expired = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.last_load_seconds = 0.0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _path(self, key: str) -> Path:
+        return self.persist_dir / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+    def _load(self):
+        if self._loaded or self.persist_dir is None:
+            return
+        self._loaded = True
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        records = []
+        for path in self.persist_dir.glob("*.json"):
+            try:
+                record = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                path.unlink(missing_ok=True)
+                continue
+            if record.get("expires_at", 0) <= now:
+                path.unlink(missing_ok=True)
+                continue
+            records.append(record)
+        for record in sorted(records, key=lambda r: r["expires_at"]):
+            self._entries[record["key"]] = (record["expires_at"], record["value"])
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+        logger.info(f"Metadata cache loaded: {len(self._entries)} entries")
+
+    def _discard(self, key: str):
+        self._entries.pop(key, None)
+        if self.persist_dir is not None:
+            self._path(key).unlink(missing_ok=True)
+
+    def _persist(self, key: str, expires_at: float, value: dict):
+        tmp = self._path(key).with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps({"key": key, "expires_at": expires_at, "value": value}), encoding="utf-8")
+            tmp.replace(self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not persist metadata cache entry: {e}")
+
+    def get(self, key: str) -> Optional[dict]:
+        self._load()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self.expired += 1
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, value: dict):
+        self._load()
+        expires_at = time.time() + self.ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self.evictions += 1
+            self._discard(next(iter(self._entries)))
+        if self.persist_dir is not None:
+            self._persist(key, expires_at, value)
+
+    async def get_or_load(self, key: str, loader) -> dict:
+        if not self.enabled:
+            return await loader()
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.shared += 1
+            try:
+                return await asyncio.shield(inflight)
+            except HTTPException as e:
+                # The leading request's client went away; take over the load instead of failing with it
+                if e.status_code != 499:
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        started = time.monotonic()
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+            else:
+                future.set_exception(HTTPException(status_code=499, detail="Client closed request"))
+            # Mark the exception retrieved so an unshared failure isn't logged as never awaited
+            future.exception()
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+            self.loads += 1
+            self.last_load_seconds = time.monotonic() - started
+            self.load_seconds += self.last_load_seconds
 
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "avg_load_ms": round(self.load_seconds / self.loads * 1000, 1) if self.loads else None,
+            "last_load_ms": round(self.last_load_seconds * 1000, 1) if self.loads else None,
+        }
 
-class MetadataReq(BaseModel):
-    playlist_url: str
 
+metadata_cache = MetadataCache(
+    METADATA_CACHE_TTL_SECONDS,
+    METADATA_CACHE_MAX_ENTRIES,
+    METADATA_CACHE_DIR if METADATA_CACHE_PERSIST else None,
+)
 
-class MetadataResp(BaseModel):
-    title: str = Field(default="")
-    artist: str = Field(default="")
-    year: str = Field(default="")
-    cover_base64: Optional[str] = None
 
+class InfoTokens:
+    """Flat playlist info from /metadata, kept on disk under short-lived tokens.
 
-class DownloadResp(BaseModel):
-    job_id: str
-    out_dir: str
-    tracks: List[TrackIn]
+    Tokens are files so any worker sharing DATA_DIR can redeem them; a token
+    only applies to the URL it was issued for.
+    """
 
+    def __init__(self, root: Path, ttl: float):
+        self.root = root
+        self.ttl = ttl
+        self.issued = 0
+        self.redeemed = 0
+        self.rejected = 0
+        self._last_prune = 0.0
 
-class FinalizeReq(BaseModel):
-    job_id: str
-    album: AlbumMeta
-    ordered_tracks: List[TrackIn]
-    cover_base64: Optional[str] = None
+    def _path(self, token: str) -> Path:
+        return self.root / f"{token}.json"
 
+    def issue(self, playlist_url: str, info: dict) -> Optional[str]:
+        if self.ttl <= 0:
+            return None
+        token = uuid.uuid4().hex
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.prune()
+        tmp = self._path(token).with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps({"url": canonical_url(playlist_url), "info": info}), encoding="utf-8")
+            tmp.replace(self._path(token))
+        except OSError as e:
+            logger.warning(f"Could not store playlist info for {playlist_url}: {e}")
+            return None
+        self.issued += 1
+        return token
 
-class FinalizeResp(BaseModel):
-    ok: bool
-    zip_url: str
-    count: int
+    def redeem(self, token: str, playlist_url: str) -> Optional[dict]:
+        path = self._path(token)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                raise FileNotFoundError(token)
+            record = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.rejected += 1
+            logger.info(f"Info token {token} expired or unknown, extracting {playlist_url} again")
+            return None
+        if record.get("url") != canonical_url(playlist_url):
+            self.rejected += 1
+            logger.info(f"Info token {token} was issued for another URL, extracting {playlist_url} again")
+            return None
+        self.redeemed += 1
+        return record.get("info")
 
+    def prune(self):
+        now = time.time()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for path in self.root.glob("*.json"):
+            try:
+                if now - path.stat().st_mtime > self.ttl:
+                    path.unlink(missing_ok=True)
+            except OSError:
+                continue
 
-class LibraryFinalizeResp(BaseModel):
-    ok: bool
-    library_path: str
-    count: int
+    def stats(self) -> dict:
+        return {"issued": self.issued, "redeemed": self.redeemed, "rejected": self.rejected}
 
 
-class ProgressResp(BaseModel):
-    job_id: str
-    current: int
-    total: int
-    status: str
-    current_title: Optional[str] = None
+info_tokens = InfoTokens(INFO_TOKEN_DIR, max(INFO_TOKEN_TTL_SECONDS, METADATA_CACHE_TTL_SECONDS))
 
 
-def run_download_with_progress(job_id: str, playlist_url: str, template: str):
-    """Run yt-dlp and track progress"""
-    cmd = [
-        "yt-dlp",
-        playlist_url,
-        "-o", template,
-        "--yes-playlist",
-        "--extract-audio",
-        "--audio-format", "mp3",
-        "--ffmpeg-location", "/usr/bin/ffmpeg",
-        "--progress",
-    ]
-    
-    # Initialize progress (assume single video until we detect playlist)
-    with progress_lock:
-        progress_store[job_id] = {
-            "current": 0,
-            "total": 1,  # Default to 1 for single videos
-            "status": "starting",
-            "current_title": None,
-        }
-    
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1,
-        universal_newlines=True
-    )
-    
-    # Parse output for progress
-    for line in process.stdout:
-        line = line.strip()
-        if not line:
-            continue
-        
-        logger.debug(f"yt-dlp output: {line}")
-            
-        # Look for playlist info: "[youtube:tab] Playlist X: Y videos"
-        playlist_info_match = re.search(r'\[.*?\]\s+Playlist.*?(\d+)\s+videos?', line, re.IGNORECASE)
-        if playlist_info_match:
-            total = int(playlist_info_match.group(1))
-            with progress_lock:
-                if progress_store[job_id]["total"] == 0:
-                    progress_store[job_id]["total"] = total
-            logger.info(f"Found playlist with {total} videos")
-        
-        # Look for "[download] Downloading video X of Y"
-        download_match = re.search(r'\[download\]\s+Downloading\s+video\s+(\d+)\s+of\s+(\d+)', line, re.IGNORECASE)
-        if download_match:
-            current = int(download_match.group(1))
-            total = int(download_match.group(2))
-            with progress_lock:
-                progress_store[job_id]["current"] = current
-                progress_store[job_id]["total"] = total
-                progress_store[job_id]["status"] = "downloading"
-            logger.info(f"Progress: {current}/{total}")
-        
-        # Look for "[download] Downloading item X of Y"
-        item_match = re.search(r'\[download\]\s+Downloading\s+item\s+(\d+)\s+of\s+(\d+)', line, re.IGNORECASE)
-        if item_match:
-            current = int(item_match.group(1))
-            total = int(item_match.group(2))
-            with progress_lock:
-                progress_store[job_id]["current"] = current
-                progress_store[job_id]["total"] = total
-                progress_store[job_id]["status"] = "downloading"
-            logger.info(f"Progress: {current}/{total}")
-        
-        # Look for video title in various formats
-        title_patterns = [
-            r'\[download\]\s+Destination:\s+.+?-\s+(.+?)\.mp3',
-            r'\[download\]\s+(.+?)\s+has already been downloaded',
-            r'\[ExtractAudio\]\s+Destination:\s+.+?-\s+(.+?)\.mp3',
-        ]
-        for pattern in title_patterns:
-            title_match = re.search(pattern, line)
-            if title_match:
-                title = title_match.group(1).strip()
-                with progress_lock:
-                    progress_store[job_id]["current_title"] = title
-                logger.debug(f"Downloading: {title}")
-                break
-        
-        # Look for completion indicators
-        if "[download] 100%" in line or "[ExtractAudio]" in line:
-            with progress_lock:
-                # For single videos, mark as complete when we see 100%
-                if progress_store[job_id]["total"] == 1 and progress_store[job_id]["current"] == 0:
-                    progress_store[job_id]["current"] = 1
-                    progress_store[job_id]["status"] = "downloading"
-                    logger.debug("Single video download progress: 1/1")
-                elif progress_store[job_id]["total"] > 1 and progress_store[job_id]["current"] < progress_store[job_id]["total"]:
-                    progress_store[job_id]["current"] += 1
-                    logger.debug(f"Incremented progress to {progress_store[job_id]['current']}")
-    
-    process.wait()
-    
-    if process.returncode != 0:
-        with progress_lock:
-            progress_store[job_id]["status"] = "error"
-        raise subprocess.CalledProcessError(process.returncode, cmd)
-    
-    # Finalize progress - ensure single videos are marked complete
-    with progress_lock:
-        if progress_store[job_id]["total"] == 1 and progress_store[job_id]["current"] == 0:
-            progress_store[job_id]["current"] = 1
-        progress_store[job_id]["status"] = "completed"
+def metadata_command(playlist_url: str, flat: bool = True, items: Optional[str] = None) -> List[str]:
+    cmd = ["yt-dlp", "--dump-single-json", "--skip-download", "--no-warnings"]
+    if flat:
+        # Playlist-level fields plus id/title/duration per entry; entries are resolved at download time
+        cmd.append("--flat-playlist")
+    if items:
+        cmd += ["--playlist-items", items]
+    cmd.append(playlist_url)
+    return cmd
 
 
-def process_download_async(job_id: str, playlist_url: str, template: str):
-    """Process download in background thread"""
+async def extract_metadata(cmd: List[str], request: Request) -> dict:
+    stdout = await metadata_runner.run(cmd, request)
     try:
-        run_download_with_progress(job_id, playlist_url, template)
-        logger.info(f"yt-dlp completed successfully for job {job_id}")
-        
-        # Build manifest
-        job_dir = JOBS_DIR / job_id
-        logger.info("Building track manifest...")
-        mp3s = sorted(p for p in job_dir.glob("*.mp3"))
-        logger.info(f"Found {len(mp3s)} MP3 files")
-        
-        # Store tracks in progress store for retrieval
-        tracks = []
-        for i, p in enumerate(mp3s, start=1):
-            title = p.stem
-            # Strip leading number prefix and dash if present
-            # For playlists: "01 - Title" -> "Title"
-            # For single videos: "00 - Title" -> "Title" or " - Title" -> "Title"
-            # Handle both numbered prefix and plain dash prefix
-            title = re.sub(r"^\d+\s*-\s*", "", title)  # Remove "01 - " or "00 - " prefix
-            title = re.sub(r"^\s*-\s*", "", title)  # Remove " - " prefix if present (single videos)
-            tracks.append({"id": i, "path": str(p), "title": title})
-            logger.debug(f"Track {i}: {title}")
-        
-        with progress_lock:
-            progress_store[job_id]["tracks"] = tracks
-            progress_store[job_id]["status"] = "completed"
-        
-        logger.info(f"Download job {job_id} completed successfully with {len(tracks)} tracks")
-    except Exception as e:
-        logger.error(f"Download failed for job {job_id}: {e}")
-        with progress_lock:
-            progress_store[job_id]["status"] = "error"
-            progress_store[job_id]["error"] = str(e)
+        return json.loads(stdout or b"{}")
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=502, detail="Invalid metadata response from yt-dlp")
 
 
-def fetch_cover_base64(url: Optional[str]) -> Optional[str]:
-    if not url:
-        return None
+@app.post("/metadata", response_model=MetadataResp)
+async def metadata(req: MetadataReq, request: Request):
+    key = f"{req.mode}:{canonical_url(req.playlist_url)}"
+    value = await metadata_cache.get_or_load(key, lambda: load_metadata(req, request))
+    return MetadataResp(**value)
 
-    headers = {"User-Agent": "Mozilla/5.0 Playlist2Album/1.0"}
-    req = urllib_request.Request(url, headers=headers)
+
+def metadata_cover(url: Optional[str]) -> Optional[str]:
+    data = fetch_cover(url)
+    if not data:
+        return None
     try:
-        with urllib_request.urlopen(req, timeout=10) as response:
-            content_type = response.headers.get("Content-Type", "")
-            if not content_type.startswith("image/"):
-                return None
-            return base64.b64encode(response.read()).decode("utf-8")
-    except (URLError, HTTPError, TimeoutError, ValueError) as e:
-        logger.warning(f"Could not fetch thumbnail for metadata prefill: {e}")
+        cover_id, _ = cover_store.put(data)
+    except ValueError as e:
+        logger.warning(f"Could not use thumbnail for metadata prefill: {e}")
         return None
+    return cover_id
 
 
-@app.post("/metadata", response_model=MetadataResp)
-def metadata(req: MetadataReq):
-    cmd = [
-        "yt-dlp",
-        "--dump-single-json",
-        "--skip-download",
-        "--no-warnings",
-        req.playlist_url,
-    ]
+def info_year(info: dict) -> str:
+    year_value = info.get("release_year")
+    if year_value:
+        return str(year_value)
+    upload_date = str(info.get("upload_date") or "")
+    return upload_date[:4] if len(upload_date) >= 4 and upload_date[:4].isdigit() else ""
 
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    except subprocess.CalledProcessError as e:
-        detail = (e.stderr or e.stdout or "Failed to fetch metadata").strip()
-        raise HTTPException(status_code=400, detail=detail)
 
+async def first_entry_year(playlist_url: str, request: Request) -> str:
+    """Year of the playlist's first entry, resolved on its own; flat listings carry no dates"""
     try:
-        payload = json.loads(result.stdout or "{}")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=502, detail="Invalid metadata response from yt-dlp")
+        payload = await extract_metadata(metadata_command(playlist_url, flat=False, items="1"), request)
+    except HTTPException as e:
+        logger.warning(f"Could not resolve the first entry of {playlist_url} for its year: {e.detail}")
+        return ""
+    entries = payload.get("entries") or []
+    first = entries[0] if entries and isinstance(entries[0], dict) else payload
+    return info_year(first)
+
+
+async def load_metadata(req: MetadataReq, request: Request) -> dict:
+    payload = await extract_metadata(metadata_command(req.playlist_url, flat=req.mode == "fast"), request)
 
     title = (payload.get("title") or payload.get("playlist_title") or "").strip()
     artist = (payload.get("uploader") or payload.get("channel") or payload.get("creator") or "").strip()
 
-    year_value = payload.get("release_year")
-    if year_value:
-        year = str(year_value)
+    entries = payload.get("entries")
+    year = info_year(payload)
+    if not year and isinstance(entries, list):
+        year = next((y for y in (info_year(e) for e in entries if isinstance(e, dict)) if y), "")
+        if not year and entries and req.mode == "fast":
+            year = await first_entry_year(req.playlist_url, request)
+
+    cover_id = await asyncio.to_thread(metadata_cover, pick_thumbnail(payload, COVER_TARGET_PX))
+
+    entry_count = payload.get("playlist_count") or (len(entries) if isinstance(entries, list) else 1)
+
+    # Only flat listings are handed to /download; a full extraction's entries carry resolved formats
+    info_token = None
+    if req.mode == "fast":
+        info_token = await asyncio.to_thread(info_tokens.issue, req.playlist_url, payload)
+
+    return MetadataResp(
+        title=title, artist=artist, year=year, entry_count=entry_count, info_token=info_token,
+        cover_id=cover_id, cover_url=f"/covers/{cover_id}" if cover_id else None,
+    ).model_dump()
+
+
+@app.post("/metadata/entries", response_model=MetadataEntriesResp)
+async def metadata_entries(req: MetadataEntriesReq, request: Request):
+    """One page of a playlist's flat entry list.
+
+    Only the requested slice (plus one entry to detect a next page) is
+    listed, so deep pages of lazily paged playlists don't fetch the rest.
+    """
+    items = f"{req.offset + 1}:{req.offset + req.limit + 1}"
+    payload = await extract_metadata(metadata_command(req.playlist_url, items=items), request)
+
+    if payload.get("_type") in ("playlist", "multi_video"):
+        raw = [e for e in (payload.get("entries") or []) if e]
+        total = payload.get("playlist_count")
     else:
-        upload_date = str(payload.get("upload_date") or "")
-        year = upload_date[:4] if len(upload_date) >= 4 and upload_date[:4].isdigit() else ""
+        # A single video is a one-entry playlist
+        raw = [payload] if req.offset == 0 else []
+        total = 1
+    entries = [
+        PlaylistEntry(
+            index=e.get("playlist_index") or req.offset + i,
+            id=e.get("id"),
+            title=e.get("title"),
+            duration=e.get("duration"),
+        )
+        for i, e in enumerate(raw[:req.limit], start=1)
+    ]
+    return MetadataEntriesResp(
+        entries=entries,
+        offset=req.offset,
+        limit=req.limit,
+        total=total,
+        has_more=len(raw) > req.limit,
+    )
+
+
+def unique_path(path: Path) -> Path:
+    """path, or "<stem> (2)<suffix>", "(3)", ... if it is taken"""
+    candidate = path
+    n = 2
+    while candidate.exists():
+        candidate = path.with_name(f"{path.stem} ({n}){path.suffix}")
+        n += 1
+    return candidate
+
+
+def tag_track(src: Path, title: str, track_number: int, album: AlbumMeta, cover_bytes: Optional[bytes]):
+    from mutagen.id3 import ID3, APIC, TIT2, TALB, TPE1, TDRC, TRCK
+    from mutagen.mp3 import MP3
+
+    if not src.exists():
+        raise FileNotFoundError(f"missing file: {src}")
+
+    # Tracks may be hardlinked to the shared audio cache
+    detach_hardlink(src)
+    audio = MP3(src, ID3=ID3)
+    if audio.tags is None:
+        audio.add_tags()
+
+    audio.tags["TIT2"] = TIT2(encoding=3, text=title)
+    audio.tags["TALB"] = TALB(encoding=3, text=sanitize(album.title))
+    audio.tags["TPE1"] = TPE1(encoding=3, text=sanitize(album.artist))
+    if album.year:
+        audio.tags["TDRC"] = TDRC(encoding=3, text=album.year)
+    audio.tags["TRCK"] = TRCK(encoding=3, text=str(track_number))
 
-    thumbnail_url = payload.get("thumbnail")
-    if not thumbnail_url:
-        thumbnails = payload.get("thumbnails") or []
-        if thumbnails and isinstance(thumbnails, list):
-            thumbnail_url = thumbnails[-1].get("url")
+    if cover_bytes:
+        audio.tags["APIC"] = APIC(
+            encoding=3, mime=image_mime(cover_bytes), type=3, desc="Cover", data=cover_bytes
+        )
 
-    cover_base64 = fetch_cover_base64(thumbnail_url)
+    audio.save(v2_version=3)  # ID3v2.3 for max compatibility
 
-    return MetadataResp(title=title, artist=artist, year=year, cover_base64=cover_base64)
 
+def set_track_number(path: Path, track_number: int):
+    from mutagen.id3 import ID3, TRCK
 
-def prepare_tracks(req: FinalizeReq) -> List[Path]:
+    tags = ID3(path)
+    tags["TRCK"] = TRCK(encoding=3, text=str(track_number))
+    tags.save(path, v2_version=3)
+
+
+def prepare_tracks(
+    req: FinalizeReq, cover_bytes: Optional[bytes] = None, first_track: int = 1
+) -> Tuple[List[Path], List[FailedTrack]]:
+    """Tag and number the ordered tracks in the job workspace.
+
+    Tracks are tagged in parallel on tag_pool, then renamed in two phases
+    (all to temporary names, then to their final names) so a new name never
+    lands on a track that hasn't moved yet, and no rename ever replaces an
+    existing file. Tracks that can't be tagged are left out and the rest are
+    numbered without gaps. Returns the final paths in album order and the tracks
+    that were left out.
+    """
     try:
-        from mutagen.id3 import ID3, APIC, TIT2, TALB, TPE1, TDRC, TRCK
-        from mutagen.mp3 import MP3
+        from mutagen.id3 import ID3  # noqa: F401
         logger.info("Mutagen imported successfully")
     except Exception as e:
         logger.error(f"Failed to import mutagen: {e}")
@@ -343,61 +3453,91 @@ def prepare_tracks(req: FinalizeReq) -> List[Path]:
         raise HTTPException(status_code=404, detail="job_id not found")
 
     logger.info(f"Job directory exists: {job_dir}")
+    logger.info(
+        f"Sanitized album title: '{sanitize(req.album.title)}', artist: '{sanitize(req.album.artist)}', "
+        f"year: '{req.album.year}'"
+    )
 
-    cover_bytes = None
-    if req.cover_base64:
+    logger.info(f"Tagging {len(req.ordered_tracks)} tracks...")
+    futures = [
+        tag_pool.submit(tag_track, Path(t.path), sanitize(t.title), first_track + pos, req.album, cover_bytes)
+        for pos, t in enumerate(req.ordered_tracks)
+    ]
+    failed: List[FailedTrack] = []
+    tagged = []
+    # Results are read in album order, whatever order the pool finishes them in
+    for pos, (t, future) in enumerate(zip(req.ordered_tracks, futures)):
         try:
-            cover_bytes = base64.b64decode(req.cover_base64)
-            logger.info(f"Cover image decoded successfully ({len(cover_bytes)} bytes)")
+            future.result()
+            tagged.append(pos)
         except Exception as e:
-            logger.error(f"Failed to decode cover image: {e}")
-            raise HTTPException(status_code=400, detail=f"Invalid cover image: {e}")
-    else:
-        logger.info("No cover image provided")
-
-    album_title = sanitize(req.album.title)
-    album_artist = sanitize(req.album.artist)
-    album_year = req.album.year
+            logger.error(f"Could not tag track {t.id} ({t.title}): {e}")
+            failed.append(FailedTrack(id=t.id, title=t.title, reason=str(e)))
+    if failed and not tagged:
+        raise HTTPException(status_code=400, detail=f"No tracks could be tagged: {failed[0].reason}")
 
-    logger.info(f"Sanitized album title: '{album_title}', artist: '{album_artist}', year: '{album_year}'")
+    # Tracks that made it are numbered consecutively; those a left-out track pushed down are retagged
+    numbers = {pos: first_track + k for k, pos in enumerate(tagged)}
+    renumbered = [pos for pos in tagged if numbers[pos] != first_track + pos]
+    if renumbered:
+        logger.info(f"Renumbering {len(renumbered)} tracks after {len(failed)} were left out")
+        futures = [
+            tag_pool.submit(set_track_number, Path(req.ordered_tracks[pos].path), numbers[pos])
+            for pos in renumbered
+        ]
+        for pos, future in zip(renumbered, futures):
+            try:
+                future.result()
+            except Exception as e:
+                t = req.ordered_tracks[pos]
+                logger.error(f"Could not renumber track {t.id} ({t.title}): {e}")
+                raise HTTPException(status_code=500, detail=f"Could not renumber {t.title}: {e}")
 
-    # Tag and rename in job workspace
-    logger.info("Starting to tag and rename tracks...")
-    final_paths: List[Path] = []
-    for idx, t in enumerate(req.ordered_tracks, start=1):
+    # Phase 1 frees every current name; if a move fails nothing has been placed yet, so undoing is safe
+    staged = []
+    for pos in tagged:
+        t = req.ordered_tracks[pos]
         src = Path(t.path)
-        if not src.exists():
-            logger.error(f"Track file not found: {src}")
-            raise HTTPException(status_code=400, detail=f"missing file: {src}")
-
-        logger.debug(f"Processing track {idx}/{len(req.ordered_tracks)}: {t.title}")
-
-        audio = MP3(src, ID3=ID3)
-        if audio.tags is None:
-            audio.add_tags()
-
-        audio.tags["TIT2"] = TIT2(encoding=3, text=sanitize(t.title))
-        audio.tags["TALB"] = TALB(encoding=3, text=album_title)
-        audio.tags["TPE1"] = TPE1(encoding=3, text=album_artist)
-        if album_year:
-            audio.tags["TDRC"] = TDRC(encoding=3, text=album_year)
-        audio.tags["TRCK"] = TRCK(encoding=3, text=str(idx))
-
-        if cover_bytes:
-            audio.tags["APIC"] = APIC(
-                encoding=3, mime="image/jpeg", type=3, desc="Cover", data=cover_bytes
-            )
-
-        audio.save(v2_version=3)  # ID3v2.3 for max compatibility
+        tmp = job_dir / f"{src.stem} ({uuid.uuid4().hex[:8]}).mp3"
+        try:
+            src.rename(tmp)
+        except OSError as e:
+            for _, moved_src, moved_tmp in reversed(staged):
+                moved_tmp.rename(moved_src)
+            logger.error(f"Could not rename track {t.id} ({t.title}): {e}")
+            raise HTTPException(status_code=500, detail=f"Could not rename {src.name}: {e}")
+        staged.append((pos, src, tmp))
 
-        new_name = job_dir / f"{str(idx).zfill(2)} - {sanitize(t.title)}.mp3"
-        if src != new_name:
-            src.rename(new_name)
-        req.ordered_tracks[idx - 1].path = str(new_name)
+    # Phase 2 never overwrites: a name still held by a track that was left out gets a numbered variant
+    final_paths: List[Path] = []
+    unplaced = []
+    renamed = {}
+    for pos, src, tmp in staged:
+        t = req.ordered_tracks[pos]
+        new_name = unique_path(job_dir / f"{str(numbers[pos]).zfill(2)} - {sanitize(t.title)}.mp3")
+        try:
+            tmp.rename(new_name)
+        except OSError as e:
+            # The track keeps its temporary name; it is tagged and still picked up as an mp3
+            logger.error(f"Could not rename track {t.id} ({t.title}) to {new_name.name}: {e}")
+            t.path = str(tmp)
+            renamed[src.name] = tmp.name
+            unplaced.append(f"{t.title}: {e}")
+            continue
+        t.path = str(new_name)
+        renamed[src.name] = new_name.name
         final_paths.append(new_name)
+    if (job_store.get(req.job_id) or {}).get("entry_ids"):
+        with job_store.edit(req.job_id) as progress:
+            progress["entry_ids"] = {renamed.get(name, name): i for name, i in progress["entry_ids"].items()}
+    if unplaced:
+        raise HTTPException(status_code=500, detail=f"Could not rename {len(unplaced)} tracks: {unplaced[0]}")
 
-    logger.info("All tracks tagged and renamed successfully")
-    return final_paths
+    if failed:
+        logger.warning(f"Tagged and renamed {len(final_paths)} tracks, {len(failed)} failed")
+    else:
+        logger.info("All tracks tagged and renamed successfully")
+    return final_paths, failed
 
 
 def create_zip(album_artist: str, album_title: str, tracks: List[Path]) -> Path:
@@ -414,7 +3554,7 @@ def create_zip(album_artist: str, album_title: str, tracks: List[Path]) -> Path:
     return zip_path
 
 
-def save_to_library(album_artist: str, album_title: str, tracks: List[Path]) -> Path:
+def library_album_dir(album_artist: str, album_title: str) -> Path:
     artist_dir = sanitize(album_artist) if album_artist else "Unknown Artist"
     album_dir = sanitize(album_title) if album_title else "Unknown Album"
     target_dir = (MUSIC_LIBRARY_ROOT / artist_dir / album_dir).resolve()
@@ -422,7 +3562,11 @@ def save_to_library(album_artist: str, album_title: str, tracks: List[Path]) ->
     # Ensure writes stay inside configured library root.
     if MUSIC_LIBRARY_ROOT not in target_dir.parents and target_dir != MUSIC_LIBRARY_ROOT:
         raise HTTPException(status_code=400, detail="invalid library destination")
+    return target_dir
+
 
+def save_to_library(album_artist: str, album_title: str, tracks: List[Path]) -> Path:
+    target_dir = library_album_dir(album_artist, album_title)
     target_dir.mkdir(parents=True, exist_ok=True)
     for track in tracks:
         target_path = target_dir / track.name
@@ -432,30 +3576,214 @@ def save_to_library(album_artist: str, album_title: str, tracks: List[Path]) ->
     return target_dir
 
 
+def library_cover(album_dir: Path) -> Optional[bytes]:
+    """Reuse the cover embedded in an album's existing tracks"""
+    from mutagen.id3 import ID3, ID3NoHeaderError
+
+    for track in sorted(album_dir.glob("*.mp3")):
+        try:
+            frames = ID3(track).getall("APIC")
+        except (ID3NoHeaderError, OSError):
+            continue
+        if frames:
+            return frames[0].data
+    return None
+
+
+def sync_to_library(job_id: str, album: AlbumMeta, tracks: List[dict]) -> Path:
+    """Tag newly synced tracks after the album's last track number and add them to the library"""
+    album_artist = sanitize(album.artist)
+    album_title = sanitize(album.title)
+    album_dir = library_album_dir(album_artist, album_title)
+    first_track = (max_track_number(album_dir) if album_dir.exists() else 0) + 1
+    req = FinalizeReq(
+        job_id=job_id,
+        album=album,
+        ordered_tracks=[TrackIn(**t) for t in tracks],
+    )
+    cover = library_cover(album_dir) if album_dir.exists() else None
+    if cover:
+        try:
+            _, cover = cover_store.put(cover)
+        except ValueError as e:
+            logger.warning(f"Could not reuse the cover of {album_dir}: {e}")
+            cover = None
+    paths, failed = prepare_tracks(req, cover, first_track=first_track)
+    for t, track in zip(tracks, req.ordered_tracks):
+        t["path"] = track.path
+    for f in failed:
+        logger.warning(f"Synced track {f.id} ({f.title}) not added to the library: {f.reason}")
+    logger.info(f"Appending {len(paths)} synced tracks to {album_dir} from track {first_track}")
+    library_dir = save_to_library(album_artist, album_title, paths)
+    archive_library_tracks(job_id, library_dir, paths)
+    return library_dir
+
+
+def job_template(job_dir: Path) -> str:
+    # Use playlist index for stable initial order; convert to mp3
+    # Template handles both playlists and single videos
+    # For playlists: "01 - Title.mp3", for single videos: "00 - Title.mp3" (we'll clean this up)
+    return str(job_dir / "%(playlist_index)02d - %(title)s.%(ext)s")
+
+
+def submit_download_job(job_id: str, request: dict, force: bool = False):
+    template = job_template(JOBS_DIR / job_id)
+    logger.info(f"Using template: {template}")
+    job_scheduler.submit(
+        job_id,
+        process_download_async,
+        (
+            job_id,
+            request["playlist_url"],
+            template,
+            request.get("concurrency"),
+            request.get("sync"),
+            AlbumMeta(**(request.get("album") or {})),
+        ),
+        priority=request.get("priority") or 0,
+        force=force,
+    )
+
+
+def resume_interrupted_jobs():
+    """Requeue jobs that were still active when their worker stopped.
+
+    With a shared store only jobs whose owner stopped heartbeating are
+    claimed. Finished entries are skipped through the job's download archive
+    and yt-dlp continues any .part files left in the job dir.
+    """
+    claimed = job_store.claim_stale(ACTIVE_STATUSES, WORKER_STALE_SECONDS)
+    jobs = sorted(claimed, key=lambda item: item[1].get("created_at") or 0)
+    for job_id, job in jobs:
+        job_dir = JOBS_DIR / job_id
+        request = job.get("request")
+        if not request or not job_dir.is_dir():
+            job_store.update(job_id, status="error", error="Interrupted by an API restart and cannot be resumed")
+            logger.warning(f"Cannot resume job {job_id}: no stored request or job directory")
+            continue
+
+        files = sorted(str(p) for p in job_dir.glob("*.mp3"))
+        job_store.update(
+            job_id,
+            status="queued",
+            current=len(files),
+            files=files,
+            resumed=(job.get("resumed") or 0) + 1,
+        )
+        submit_download_job(job_id, request, force=True)
+        logger.info(f"Resumed job {job_id} with {len(files)} tracks already on disk")
+
+
+class WorkerHeartbeat:
+    """Keeps this worker visible to the others sharing the job store.
+
+    Every beat also picks up cancel requests for jobs this worker owns, and
+    every WORKER_STALE_SECONDS it takes over jobs of workers that went quiet.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="worker-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        last_takeover = time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                job_store.heartbeat()
+                if worker_board is not None:
+                    worker_board.prune()
+                for job_id in job_store.cancel_requests():
+                    logger.info(f"Cancelling job {job_id} on request from another worker")
+                    cancel_local_job(job_id)
+                if RESUME_JOBS_ON_STARTUP and time.monotonic() - last_takeover >= WORKER_STALE_SECONDS:
+                    last_takeover = time.monotonic()
+                    resume_interrupted_jobs()
+            except Exception as e:
+                logger.error(f"Worker heartbeat failed: {e}")
+
+
+worker_heartbeat = WorkerHeartbeat(WORKER_HEARTBEAT_SECONDS)
+
+
 @app.post("/download", response_model=DownloadResp)
 def download(req: DownloadReq):
-    job_id = str(uuid.uuid4())
-    job_dir = JOBS_DIR / job_id
-    job_dir.mkdir(parents=True, exist_ok=True)
+    if req.sync and DOWNLOAD_ENGINE == "cli":
+        raise HTTPException(status_code=400, detail="sync requires the api download engine")
+    if DISK_ADMISSION and disk_budget.available() <= 0:
+        disk_budget.rejections += 1
+        raise HTTPException(status_code=507, detail="Not enough disk space to start a download, try again later")
+
+    if req.sync == "job":
+        # Re-run an existing job; entries in its download archive are skipped
+        if not req.sync_job_id:
+            raise HTTPException(status_code=400, detail="sync_job_id is required for job sync")
+        job_id = req.sync_job_id
+        job_dir = JOBS_DIR / job_id
+        if not job_dir.is_dir():
+            raise HTTPException(status_code=404, detail="job_id not found")
+        status = (job_store.get(job_id) or {}).get("status")
+        if status in ACTIVE_STATUSES:
+            raise HTTPException(status_code=409, detail="Job is still running")
+    else:
+        job_id = str(uuid.uuid4())
+        job_dir = JOBS_DIR / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
 
     logger.info(f"Starting download job {job_id}")
     logger.info(f"Playlist URL: {req.playlist_url}")
     logger.info(f"Album metadata - Title: '{req.album.title}', Artist: '{req.album.artist}', Year: '{req.album.year}'")
     logger.info(f"Output directory: {job_dir}")
 
-    # Use playlist index for stable initial order; convert to mp3
-    # Template handles both playlists and single videos
-    # For playlists: "01 - Title.mp3", for single videos: "00 - Title.mp3" (we'll clean this up)
-    template = str(job_dir / "%(playlist_index)02d - %(title)s.%(ext)s")
-    logger.info(f"Using template: {template}")
+    # A re-run always lists the playlist afresh unless it brings a new token
+    job_info_path(job_id).unlink(missing_ok=True)
+    info = info_tokens.redeem(req.info_token, req.playlist_url) if req.info_token else None
+    if info is not None:
+        job_info_path(job_id).write_text(json.dumps(info), encoding="utf-8")
 
-    # Start download in background thread
-    thread = threading.Thread(
-        target=process_download_async,
-        args=(job_id, req.playlist_url, template)
+    # Hand the job to this worker's scheduler; it starts once a slot is free.
+    # The request is kept on the job so it can be resumed after a restart.
+    request = req.model_dump(include={"playlist_url", "album", "concurrency", "priority", "sync"})
+    # A re-run without a cover keeps the one the job was started with
+    cover_id = req.cover_id or (job_store.peek(job_id) or {}).get("cover_id")
+    job_store.claim(job_id)
+    update_progress(
+        job_id,
+        current=0,
+        total=0,
+        status="queued",
+        current_title=None,
+        request=request,
+        created_at=time.time(),
+        cover_id=cover_id,
     )
-    thread.daemon = True
-    thread.start()
+    try:
+        submit_download_job(job_id, request)
+    except QueueFullError:
+        logger.warning(f"Rejecting job {job_id}: download queue is full")
+        if req.sync == "job":
+            update_progress(job_id, status=status or "completed")
+        else:
+            job_store.delete(job_id)
+            shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(
+            status_code=429,
+            detail="Download queue is full, try again later",
+            headers={"Retry-After": str(QUEUE_RETRY_AFTER_SECONDS)},
+        )
 
     # Return immediately with job_id
     return DownloadResp(job_id=job_id, out_dir=str(job_dir), tracks=[])
@@ -464,9 +3792,10 @@ def download(req: DownloadReq):
 @app.get("/download/result/{job_id}", response_model=DownloadResp)
 def get_download_result(job_id: str):
     """Get the final download result once completed"""
-    with progress_lock:
-        progress = progress_store.get(job_id)
-    
+    return download_result(job_id, job_store.get(job_id))
+
+
+def download_result(job_id: str, progress: Optional[dict]) -> DownloadResp:
     if not progress:
         raise HTTPException(status_code=404, detail="Job not found")
     
@@ -474,14 +3803,97 @@ def get_download_result(job_id: str):
         error_msg = progress.get("error", "Unknown error")
         raise HTTPException(status_code=500, detail=f"Download failed: {error_msg}")
     
-    if progress.get("status") != "completed":
+    if progress.get("status") == "cancelled":
+        raise HTTPException(status_code=409, detail="Job was cancelled")
+
+    if progress.get("status") not in ("completed", "completed_with_errors"):
         raise HTTPException(status_code=202, detail="Job still in progress")
     
     tracks_data = progress.get("tracks", [])
     tracks = [TrackIn(**t) for t in tracks_data]
+    failed = [FailedEntry(**f) for f in progress.get("failed") or []]
     job_dir = JOBS_DIR / job_id
     
-    return DownloadResp(job_id=job_id, out_dir=str(job_dir), tracks=tracks)
+    return DownloadResp(job_id=job_id, out_dir=str(job_dir), tracks=tracks, failed=failed)
+
+
+@app.delete("/jobs/{job_id}", response_model=CancelResp)
+@app.post("/jobs/{job_id}/cancel", response_model=CancelResp)
+def cancel_job(job_id: str):
+    job = job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.get("status") not in ACTIVE_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is not running (status: {job.get('status')})")
+
+    logger.info(f"Cancelling job {job_id}")
+    status = cancel_local_job(job_id)
+    if status is None:
+        if job_store.request_cancel(job_id, WORKER_STALE_SECONDS):
+            # The owning worker picks the flag up on its next heartbeat
+            return CancelResp(job_id=job_id, status="cancelling")
+        # No live worker owns the job, so nothing else will write its status
+        job_store.update(job_id, status="cancelled")
+        status = "cancelled"
+    return CancelResp(job_id=job_id, status=status)
+
+
+def cancel_local_job(job_id: str) -> Optional[str]:
+    """Cancel a job queued or running in this worker; None if it isn't here.
+
+    A running job is only signalled and reported as "cancelling"; its worker
+    writes the final "cancelled" status once it has stopped and cleaned up.
+    """
+    if job_scheduler.remove(job_id):
+        remove_partial_files(JOBS_DIR / job_id)
+        job_store.update(job_id, status="cancelled")
+        return "cancelled"
+    if job_scheduler.is_running(job_id):
+        # Kills the job's yt-dlp/ffmpeg process groups; the worker then cleans up and frees its slot
+        job_control(job_id).cancel()
+        return "cancelling"
+    return None
+
+
+@app.post("/covers", response_model=CoverResp)
+async def upload_cover(file: UploadFile = File(...)):
+    """Store an uploaded cover image; finalize requests then reference it by ID"""
+    limit = COVER_UPLOAD_MAX_MB * 1024 * 1024
+    chunks = []
+    size = 0
+    try:
+        while chunk := await file.read(1024 * 1024):
+            size += len(chunk)
+            if size > limit:
+                raise HTTPException(status_code=413, detail=f"Cover images are limited to {COVER_UPLOAD_MAX_MB} MB")
+            chunks.append(chunk)
+    finally:
+        await file.close()
+    try:
+        cover_id, cover = await asyncio.to_thread(cover_store.put, b"".join(chunks))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cover image: {e}")
+    logger.info(f"Stored uploaded cover {cover_id} ({size} bytes in, {len(cover)} stored)")
+    return CoverResp(cover_id=cover_id, cover_url=f"/covers/{cover_id}", bytes=len(cover))
+
+
+@app.get("/covers/{cover_id}")
+def get_cover(cover_id: str):
+    path = cover_store.path(cover_id) if re.fullmatch(r"[0-9a-f]{64}", cover_id) else None
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="cover not found")
+    cover_store.touch(path)
+    with open(path, "rb") as f:
+        head = f.read(12)
+    # Covers are content-addressed, so a URL's bytes never change
+    return FileResponse(path, media_type=image_mime(head), headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+def cover_savings(cover: Optional[bytes], original_size: int, track_count: int) -> int:
+    saved = (original_size - len(cover)) * track_count if cover else 0
+    if saved:
+        logger.info(f"Normalized cover saved {saved} bytes across {track_count} tracks")
+    return saved
 
 
 @app.post("/finalize", response_model=FinalizeResp)
@@ -492,14 +3904,20 @@ def finalize(req: FinalizeReq):
     
     album_title = sanitize(req.album.title)
     album_artist = sanitize(req.album.artist)
-    tracks = prepare_tracks(req)
+    cover, original_size = album_cover(req)
+    tracks, failed = prepare_tracks(req, cover)
     zip_path = create_zip(album_artist, album_title, tracks)
+    # Keeps the janitor off the job's files while the user fetches the zip, and off
+    # the cover while the job can still be finalized again
+    update_progress(req.job_id, finalized_at=time.time(), cover_id=request_cover_id(req))
     logger.info(f"Finalize job {req.job_id} completed successfully")
 
     return FinalizeResp(
         ok=True,
         zip_url=f"/download/{zip_path.name}",
-        count=len(req.ordered_tracks)
+        count=len(tracks),
+        cover_bytes_saved=cover_savings(cover, original_size, len(tracks)),
+        failed=failed,
     )
 
 
@@ -511,36 +3929,221 @@ def finalize_library(req: FinalizeReq):
 
     album_title = sanitize(req.album.title)
     album_artist = sanitize(req.album.artist)
-    tracks = prepare_tracks(req)
+    cover, original_size = album_cover(req)
+    tracks, failed = prepare_tracks(req, cover)
     library_dir = save_to_library(album_artist, album_title, tracks)
+    # Later library syncs of this album skip what this job put there
+    archive_library_tracks(req.job_id, library_dir, tracks)
+    update_progress(req.job_id, finalized_at=time.time(), cover_id=request_cover_id(req))
 
     logger.info(f"Library finalize job {req.job_id} completed successfully")
     return LibraryFinalizeResp(
         ok=True,
         library_path=str(library_dir),
-        count=len(req.ordered_tracks)
+        count=len(tracks),
+        cover_bytes_saved=cover_savings(cover, original_size, len(tracks)),
+        failed=failed,
     )
 
 
 @app.get("/progress/{job_id}", response_model=ProgressResp)
-def get_progress(job_id: str):
-    with progress_lock:
-        progress = progress_store.get(job_id, {
-            "current": 0,
-            "total": 0,
-            "status": "unknown",
-            "current_title": None,
-        })
-    
+async def get_progress(
+    job_id: str,
+    request: Request,
+    response: Response,
+    wait: float = 0,
+    since: Optional[int] = None,
+):
+    """Job progress with ETag/If-None-Match support.
+
+    With wait and since, blocks up to wait seconds until the job's version
+    moves past since or, for a queued job, its queue position changes.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    wait = min(max(wait, 0.0), PROGRESS_MAX_WAIT_SECONDS)
+    if wait > 0 and since is not None:
+        deadline = time.monotonic() + wait
+        first_etag = None
+        while True:
+            changed = job_watchers.event(job_id)
+            progress = job_store.get(job_id)
+            version = (progress or {}).get("version", 0)
+            etag = progress_etag(job_id, progress)
+            first_etag = first_etag or etag
+            # The client's own ETag tells whether the position it last saw is still current
+            moved = not etag_matches(if_none_match, etag) if if_none_match else etag != first_etag
+            remaining = deadline - time.monotonic()
+            if (
+                version > since or moved or progress is None
+                or progress.get("status") in TERMINAL_STATUSES or remaining <= 0
+            ):
+                job_watchers.release(job_id, changed)
+                break
+            await wait_for_job_change(job_id, changed, progress_wait(progress, remaining))
+    else:
+        progress = job_store.get(job_id)
+        etag = progress_etag(job_id, progress)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return progress_response(job_id, progress)
+
+
+async def wait_for_job_change(job_id: str, changed: asyncio.Event, timeout: float) -> bool:
+    """Wait for a job to change; False on timeout.
+
+    Changes made by another worker don't fire local events, so jobs owned
+    elsewhere are re-read every REMOTE_POLL_SECONDS instead.
+    """
+    if job_store.is_local(job_id):
+        return await job_watchers.wait(job_id, changed, timeout)
+    job_watchers.release(job_id, changed)
+    await asyncio.sleep(min(timeout, REMOTE_POLL_SECONDS))
+    return True
+
+
+def progress_etag(job_id: str, progress: Optional[dict]) -> str:
+    """ETag of a progress snapshot; queue moves don't bump the job version, so queued jobs add their position"""
+    version = (progress or {}).get("version", 0)
+    if (progress or {}).get("status") == "queued":
+        return f'"{version}-q{job_scheduler.position(job_id)}"'
+    return f'"{version}"'
+
+
+def progress_wait(progress: Optional[dict], remaining: float) -> float:
+    # Queue positions change without a job event, so queued jobs are re-checked every REMOTE_POLL_SECONDS
+    if (progress or {}).get("status") == "queued":
+        return min(remaining, REMOTE_POLL_SECONDS)
+    return remaining
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def suggest_poll_interval(status: str, queue_position: Optional[int]) -> Optional[int]:
+    if status in TERMINAL_STATUSES:
+        return None
+    if status == "queued":
+        return min(2000 * (queue_position or 1), 15000)
+    if status == "processing":
+        return 500
+    if status == "waiting_for_space":
+        return 5000
+    if status in ACTIVE_STATUSES:
+        return 1000
+    return 5000
+
+
+def progress_response(job_id: str, progress: Optional[dict]) -> ProgressResp:
+    progress = progress or {
+        "current": 0,
+        "total": 0,
+        "status": "unknown",
+        "current_title": None,
+    }
+
+    status = progress.get("status", "unknown")
+    queue_position = job_scheduler.position(job_id) if status == "queued" else None
+    downloads = (progress.get("downloads") or []) if status in ACTIVE_STATUSES else []
     return ProgressResp(
         job_id=job_id,
         current=progress.get("current", 0),
         total=progress.get("total", 0),
-        status=progress.get("status", "unknown"),
+        status=status,
         current_title=progress.get("current_title"),
+        queue_position=queue_position,
+        stages=stage_progress(progress.get("stages"), downloads),
+        failed_count=len(progress.get("failed") or []),
+        downloads=downloads,
+        downloaded_bytes=progress.get("downloaded_bytes") or 0,
+        speed=progress.get("speed"),
+        average_speed=progress.get("average_speed"),
+        eta_seconds=None if status in TERMINAL_STATUSES else progress.get("eta_seconds"),
+        version=progress.get("version", 0),
+        poll_after_ms=suggest_poll_interval(status, queue_position),
+    )
+
+
+def sse_message(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events: a "progress" message whenever the job changes, then one "done"
+    message carrying the final result (track manifest or error) before the stream closes."""
+    if job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        last_etag = None
+        last_sent = time.monotonic()
+        while True:
+            changed = job_watchers.event(job_id)
+            # Released exactly once, even when the client disconnects mid-yield
+            held = True
+            try:
+                job = job_store.get(job_id) or {}
+                etag = progress_etag(job_id, job)
+                if etag != last_etag:
+                    last_etag = etag
+                    last_sent = time.monotonic()
+                    yield sse_message("progress", progress_response(job_id, job).model_dump_json())
+
+                if job.get("status") in TERMINAL_STATUSES:
+                    done = {"progress": progress_response(job_id, job).model_dump()}
+                    try:
+                        done["result"] = download_result(job_id, job).model_dump()
+                    except HTTPException as e:
+                        done["error"] = e.detail
+                    yield sse_message("done", json.dumps(done))
+                    return
+
+                if await request.is_disconnected():
+                    return
+                if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                # wait_for_job_change releases the event itself
+                held = False
+                if not await wait_for_job_change(job_id, changed, progress_wait(job, SSE_KEEPALIVE_SECONDS)):
+                    continue
+            finally:
+                if held:
+                    job_watchers.release(job_id, changed)
+            # Coalesce bursts of byte-level updates into one message per interval
+            await asyncio.sleep(SSE_MIN_INTERVAL_SECONDS)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "event_streams": {"watched_jobs": job_watchers.watched()},
+        "scheduler": job_scheduler.stats(),
+        "audio_cache": audio_cache.stats(),
+        "job_store": job_store.stats(),
+        "janitor": janitor.stats(),
+        "disk_budget": disk_budget.stats(),
+        "metadata": metadata_runner.stats(),
+        "metadata_cache": metadata_cache.stats(),
+        "info_tokens": info_tokens.stats(),
+        "covers": cover_store.stats(),
+    }
+
+
 @app.get("/download/{zip_name}")
 def serve_zip(zip_name: str):
     logger.info(f"Serving ZIP file: {zip_name}")
@@ -0,0 +1,96 @@
+"""prepare_tracks renaming and numbering. Run from the api directory:
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="p2a-test-"))
+os.environ.setdefault("JOB_STORE", "memory")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+from mutagen.id3 import ID3  # noqa: E402
+from mutagen.mp3 import MP3  # noqa: E402
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz
+FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+
+
+class PrepareTracksTest(unittest.TestCase):
+    def setUp(self):
+        self.job_id = f"test-{uuid.uuid4().hex[:8]}"
+        self.job_dir = main.JOBS_DIR / self.job_id
+        self.job_dir.mkdir(parents=True)
+
+    def track(self, track_id: int, name: str, title: str, frames: int) -> main.TrackIn:
+        path = self.job_dir / name
+        path.write_bytes(FRAME * frames)
+        return main.TrackIn(id=track_id, path=str(path), title=title)
+
+    def broken(self, track_id: int, name: str, title: str) -> main.TrackIn:
+        path = self.job_dir / name
+        path.write_bytes(b"not an mp3")
+        return main.TrackIn(id=track_id, path=str(path), title=title)
+
+    def finalize(self, tracks):
+        req = main.FinalizeReq(job_id=self.job_id, album=main.AlbumMeta(title="Album"), ordered_tracks=tracks)
+        return main.prepare_tracks(req)
+
+    def frames(self, path: Path) -> int:
+        return round(MP3(path).info.length * 44100 / 1152)
+
+    def tags(self, path: Path):
+        tags = ID3(path)
+        return str(tags["TRCK"]), str(tags["TIT2"])
+
+    def test_reorder_swaps_names(self):
+        tracks = [
+            self.track(1, "01 - A.mp3", "A", 10),
+            self.track(2, "02 - B.mp3", "B", 20),
+            self.track(3, "03 - C.mp3", "C", 30),
+        ]
+        paths, failed = self.finalize(list(reversed(tracks)))
+
+        self.assertEqual(failed, [])
+        self.assertEqual([p.name for p in paths], ["01 - C.mp3", "02 - B.mp3", "03 - A.mp3"])
+        self.assertEqual([self.frames(p) for p in paths], [30, 20, 10])
+        self.assertEqual(sorted(p.name for p in self.job_dir.iterdir()), sorted(p.name for p in paths))
+
+    def test_left_out_track_keeps_its_file(self):
+        # T2 wants "02 - B.mp3", which the track that can't be tagged still holds
+        tracks = [
+            self.track(1, "03 - C.mp3", "A", 10),
+            self.track(2, "01 - A.mp3", "B", 20),
+            self.broken(3, "02 - B.mp3", "F"),
+        ]
+        paths, failed = self.finalize(tracks)
+
+        self.assertEqual([f.id for f in failed], [3])
+        self.assertEqual([p.name for p in paths], ["01 - A.mp3", "02 - B (2).mp3"])
+        self.assertEqual([self.frames(p) for p in paths], [10, 20])
+        self.assertEqual([self.tags(p) for p in paths], [("1", "A"), ("2", "B")])
+        self.assertEqual((self.job_dir / "02 - B.mp3").read_bytes(), b"not an mp3")
+        self.assertEqual(len(list(self.job_dir.iterdir())), 3)
+
+    def test_left_out_track_leaves_no_gap(self):
+        tracks = [
+            self.track(1, "01 - A.mp3", "A", 10),
+            main.TrackIn(id=2, path=str(self.job_dir / "missing.mp3"), title="B"),
+            self.track(3, "03 - C.mp3", "C", 30),
+            self.track(4, "04 - D.mp3", "D", 40),
+        ]
+        paths, failed = self.finalize(tracks)
+
+        self.assertEqual([f.id for f in failed], [2])
+        self.assertEqual([p.name for p in paths], ["01 - A.mp3", "02 - C.mp3", "03 - D.mp3"])
+        self.assertEqual([self.tags(p) for p in paths], [("1", "A"), ("2", "C"), ("3", "D")])
+        self.assertEqual([self.frames(p) for p in paths], [10, 30, 40])
+
+
+if __name__ == "__main__":
+    unittest.main()
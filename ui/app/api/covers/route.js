@@ -0,0 +1,71 @@
+export const dynamic = "force-dynamic";
+
+export async function GET(request) {
+  const { searchParams } = new URL(request.url);
+  const coverId = searchParams.get("coverId");
+
+  if (!coverId) {
+    return new Response(JSON.stringify({ detail: "coverId parameter required" }), {
+      status: 400,
+      headers: { "Content-Type": "application/json" },
+    });
+  }
+
+  const base = process.env.API_BASE_INTERNAL || "http://api:8000";
+
+  try {
+    const response = await fetch(`${base}/covers/${encodeURIComponent(coverId)}`, {
+      signal: request.signal,
+    });
+    if (!response.ok) {
+      const data = await response.text();
+      return new Response(data, {
+        status: response.status,
+        headers: { "Content-Type": "application/json" },
+      });
+    }
+    return new Response(response.body, {
+      status: 200,
+      headers: {
+        "Content-Type": response.headers.get("content-type") || "image/jpeg",
+        "Cache-Control": response.headers.get("cache-control") || "no-cache",
+      },
+    });
+  } catch (error) {
+    return new Response(
+      JSON.stringify({ detail: error.message || "Internal server error" }),
+      {
+        status: 500,
+        headers: { "Content-Type": "application/json" },
+      }
+    );
+  }
+}
+
+export async function POST(request) {
+  const base = process.env.API_BASE_INTERNAL || "http://api:8000";
+
+  try {
+    // Stream the multipart body through as-is; the boundary lives in the content type
+    const response = await fetch(`${base}/covers`, {
+      method: "POST",
+      headers: { "content-type": request.headers.get("content-type") || "" },
+      body: request.body,
+      duplex: "half",
+    });
+
+    const data = await response.text();
+    return new Response(data, {
+      status: response.status,
+      headers: { "Content-Type": "application/json" },
+    });
+  } catch (error) {
+    return new Response(
+      JSON.stringify({ detail: error.message || "Internal server error" }),
+      {
+        status: 500,
+        headers: { "Content-Type": "application/json" },
+      }
+    );
+  }
+}
@@ -0,0 +1,46 @@
+export const dynamic = "force-dynamic";
+
+export async function GET(request) {
+  const { searchParams } = new URL(request.url);
+  const jobId = searchParams.get("jobId");
+
+  if (!jobId) {
+    return new Response(JSON.stringify({ detail: "jobId parameter required" }), {
+      status: 400,
+      headers: { "Content-Type": "application/json" },
+    });
+  }
+
+  const base = process.env.API_BASE_INTERNAL || "http://api:8000";
+
+  try {
+    // Pass the upstream event stream through unbuffered; aborting it when the browser disconnects
+    const response = await fetch(`${base}/jobs/${jobId}/events`, {
+      signal: request.signal,
+      cache: "no-store",
+    });
+    if (!response.ok || !response.body) {
+      const data = await response.text();
+      return new Response(data, {
+        status: response.status,
+        headers: { "Content-Type": "application/json" },
+      });
+    }
+    return new Response(response.body, {
+      status: 200,
+      headers: {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache, no-transform",
+        Connection: "keep-alive",
+      },
+    });
+  } catch (error) {
+    return new Response(
+      JSON.stringify({ detail: error.message || "Internal server error" }),
+      {
+        status: 500,
+        headers: { "Content-Type": "application/json" },
+      }
+    );
+  }
+}
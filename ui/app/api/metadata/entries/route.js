@@ -0,0 +1,26 @@
+export async function POST(request) {
+  const base = process.env.API_BASE_INTERNAL || "http://api:8000";
+
+  try {
+    const body = await request.json();
+    const response = await fetch(`${base}/metadata/entries`, {
+      method: "POST",
+      headers: { "content-type": "application/json" },
+      body: JSON.stringify(body),
+    });
+
+    const data = await response.text();
+    return new Response(data, {
+      status: response.status,
+      headers: { "Content-Type": "application/json" },
+    });
+  } catch (error) {
+    return new Response(
+      JSON.stringify({ detail: error.message || "Internal server error" }),
+      {
+        status: 500,
+        headers: { "Content-Type": "application/json" },
+      }
+    );
+  }
+}
@@ -1,3 +1,5 @@
+export const dynamic = "force-dynamic";
+
 export async function GET(request) {
   const { searchParams } = new URL(request.url);
   const jobId = searchParams.get("jobId");
@@ -12,11 +14,29 @@ export async function GET(request) {
   const base = process.env.API_BASE_INTERNAL || "http://api:8000";
 
   try {
-    const response = await fetch(`${base}/progress/${jobId}`);
+    // Forward long-poll parameters and the client's ETag so unchanged snapshots come back as 304
+    const upstream = new URLSearchParams();
+    for (const key of ["wait", "since"]) {
+      const value = searchParams.get(key);
+      if (value !== null) upstream.set(key, value);
+    }
+    const query = upstream.toString();
+    const ifNoneMatch = request.headers.get("if-none-match");
+    const response = await fetch(`${base}/progress/${jobId}${query ? `?${query}` : ""}`, {
+      signal: request.signal,
+      cache: "no-store",
+      headers: ifNoneMatch ? { "If-None-Match": ifNoneMatch } : {},
+    });
+    const headers = { "Cache-Control": "no-cache" };
+    const etag = response.headers.get("etag");
+    if (etag) headers.ETag = etag;
+    if (response.status === 304) {
+      return new Response(null, { status: 304, headers });
+    }
     const data = await response.text();
     return new Response(data, {
       status: response.status,
-      headers: { "Content-Type": "application/json" },
+      headers: { ...headers, "Content-Type": "application/json" },
     });
   } catch (error) {
     return new Response(
@@ -56,7 +56,7 @@ export default function OrderPage() {
           job_id: job.job_id,
           album: job.album,
           ordered_tracks: tracks,
-          cover_base64: job.coverBase64 || null,
+          cover_id: job.coverId || null,
         }),
       });
 
@@ -66,6 +66,9 @@ export default function OrderPage() {
       }
 
       const data = await response.json();
+      if (data.failed?.length) {
+        console.warn("Some tracks were left out of the album:", data.failed);
+      }
       // Download the zip file
       window.location.href = `${apiBaseExternal}${data.zip_url}`;
     } catch (err) {
@@ -89,7 +92,7 @@ export default function OrderPage() {
           job_id: job.job_id,
           album: job.album,
           ordered_tracks: tracks,
-          cover_base64: job.coverBase64 || null,
+          cover_id: job.coverId || null,
         }),
       });
 
@@ -99,7 +102,11 @@ export default function OrderPage() {
       }
 
       const data = await response.json();
-      setSuccessMessage(`Saved ${data.count || tracks.length} tracks to ${data.library_path}`);
+      setSuccessMessage(
+        data.failed?.length
+          ? `Saved ${data.count} tracks to ${data.library_path}, ${data.failed.length} could not be tagged: ${data.failed.map((t) => t.title).join(", ")}`
+          : `Saved ${data.count || tracks.length} tracks to ${data.library_path}`
+      );
       setLoading(false);
     } catch (err) {
       setError(err.message || "Failed to save album to library");
@@ -4,6 +4,9 @@ import { useState, useEffect, useRef } from "react";
 import { useRouter } from "next/navigation";
 import styles from "./page.module.css";
 
+// Job statuses that can still change; anything else is final
+const ACTIVE_STATUSES = ["queued", "starting", "waiting_for_space", "downloading", "processing"];
+
 export default function Home() {
   const [playlistUrl, setPlaylistUrl] = useState("");
   const [albumTitle, setAlbumTitle] = useState("");
@@ -11,42 +14,65 @@ export default function Home() {
   const [year, setYear] = useState("");
   const [detailsVisible, setDetailsVisible] = useState(false);
   const [metadataLoading, setMetadataLoading] = useState(false);
-  const [autoCoverBase64, setAutoCoverBase64] = useState("");
-  const [cover, setCover] = useState(null);
+  const [coverId, setCoverId] = useState("");
+  const [coverUploading, setCoverUploading] = useState(false);
+  const [infoToken, setInfoToken] = useState("");
   const [coverFileName, setCoverFileName] = useState("");
   const [coverPreview, setCoverPreview] = useState("");
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
-  const [progress, setProgress] = useState({ current: 0, total: 0, status: "", currentTitle: "" });
+  const [progress, setProgress] = useState({ current: 0, total: 0, status: "", currentTitle: "", queuePosition: null, speed: null, etaSeconds: null });
   const progressIntervalRef = useRef(null);
+  const eventSourceRef = useRef(null);
   const router = useRouter();
 
-  const toBase64 = (file) =>
-    new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onload = () => {
-        const result = reader.result;
-        const base64 = result.split(",").pop() || "";
-        resolve(base64);
-      };
-      reader.onerror = reject;
-      reader.readAsDataURL(file);
+  const formatSpeed = (bytesPerSecond) => {
+    if (!bytesPerSecond) return "";
+    if (bytesPerSecond >= 1024 * 1024) return `${(bytesPerSecond / (1024 * 1024)).toFixed(1)} MB/s`;
+    return `${Math.round(bytesPerSecond / 1024)} KB/s`;
+  };
+
+  const formatEta = (seconds) => {
+    if (seconds === null || seconds === undefined) return "";
+    if (seconds < 60) return `${seconds}s left`;
+    const minutes = Math.round(seconds / 60);
+    if (minutes < 60) return `${minutes} min left`;
+    return `${Math.floor(minutes / 60)}h ${minutes % 60}m left`;
+  };
+
+  // Covers are uploaded once and referenced by ID when finalizing
+  const uploadCover = async (file) => {
+    const body = new FormData();
+    body.append("file", file);
+    const response = await fetch("/api/covers", { method: "POST", body });
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({ detail: "Cover upload failed" }));
+      throw new Error(errorData.detail || "Cover upload failed");
+    }
+    return (await response.json()).cover_id;
+  };
+
+  const applyProgress = (progressData) => {
+    setProgress({
+      current: progressData.current || 0,
+      total: progressData.total || 0,
+      status: progressData.status || "",
+      currentTitle: progressData.current_title || "",
+      queuePosition: progressData.queue_position ?? null,
+      speed: progressData.speed ?? null,
+      etaSeconds: progressData.eta_seconds ?? null,
     });
+  };
 
   const pollProgress = async (jobId) => {
     try {
       const response = await fetch(`/api/progress?jobId=${jobId}`);
       if (response.ok) {
         const progressData = await response.json();
-        setProgress({
-          current: progressData.current || 0,
-          total: progressData.total || 0,
-          status: progressData.status || "",
-          currentTitle: progressData.current_title || "",
-        });
+        applyProgress(progressData);
         
         // If completed or error, stop polling
-        if (progressData.status === "completed") {
+        if (progressData.status === "completed" || progressData.status === "completed_with_errors") {
           if (progressIntervalRef.current) {
             clearInterval(progressIntervalRef.current);
             progressIntervalRef.current = null;
@@ -59,17 +85,27 @@ export default function Home() {
           return true; // Signal completion
         }
         
-        if (progressData.status === "error") {
+        // Any other status the job can't leave (error, cancelled) ends polling too;
+        // the result request then reports why
+        if (progressData.status && !ACTIVE_STATUSES.includes(progressData.status)) {
           if (progressIntervalRef.current) {
             clearInterval(progressIntervalRef.current);
             progressIntervalRef.current = null;
           }
-          showNotification("Download Failed", {
-            body: "There was an error downloading the playlist.",
+          const cancelled = progressData.status === "cancelled";
+          showNotification(cancelled ? "Download Cancelled" : "Download Failed", {
+            body: cancelled ? "The download was cancelled." : "There was an error downloading the playlist.",
             tag: "download-error",
           });
           return true; // Signal completion
         }
+      } else if (response.status === 404) {
+        // The job is gone, so it will never finish
+        if (progressIntervalRef.current) {
+          clearInterval(progressIntervalRef.current);
+          progressIntervalRef.current = null;
+        }
+        return true;
       }
     } catch (err) {
       console.error("Error polling progress:", err);
@@ -135,17 +171,15 @@ export default function Home() {
       setAlbumTitle(data.title || "");
       setAlbumArtist(data.artist || "");
       setYear(data.year || "");
+      setInfoToken(data.info_token || "");
 
-      if (data.cover_base64) {
-        const sourceDataUrl = `data:image/jpeg;base64,${data.cover_base64}`;
-        const croppedDataUrl = await cropDataUrlToSquare(sourceDataUrl, "image/jpeg");
-        setAutoCoverBase64(croppedDataUrl.split(",").pop() || "");
-        setCover(null);
+      if (data.cover_id) {
+        // The server already cropped the thumbnail to a square
+        setCoverId(data.cover_id);
         setCoverFileName("Auto-filled from playlist");
-        setCoverPreview(croppedDataUrl);
+        setCoverPreview(`/api/covers?coverId=${data.cover_id}`);
       } else {
-        setAutoCoverBase64("");
-        setCover(null);
+        setCoverId("");
         setCoverFileName("");
         setCoverPreview("");
       }
@@ -162,20 +196,130 @@ export default function Home() {
     setAlbumTitle("");
     setAlbumArtist("");
     setYear("");
-    setAutoCoverBase64("");
-    setCover(null);
+    setCoverId("");
+    setInfoToken("");
     setCoverFileName("");
     setCoverPreview("");
     setDetailsVisible(false);
     setError("");
   };
 
+  const completeDownload = async (finalData) => {
+    if (finalData.failed?.length) {
+      console.warn("Some playlist entries could not be downloaded:", finalData.failed);
+    }
+    sessionStorage.setItem(
+      "p2a-manifest",
+      JSON.stringify({
+        ...finalData,
+        album: {
+          title: albumTitle,
+          artist: albumArtist,
+          year: year,
+        },
+        coverId: coverId || null,
+      })
+    );
+
+    // Show notification
+    showNotification("Playlist2Album Complete!", {
+      body: finalData.failed?.length
+        ? `Downloaded ${finalData.tracks?.length || 0} tracks, ${finalData.failed.length} could not be downloaded. Ready to proceed to ordering.`
+        : `Successfully downloaded ${finalData.tracks?.length || 0} tracks. Ready to proceed to ordering.`,
+      tag: "download-complete",
+    });
+
+    router.push("/order");
+  };
+
+  const startPolling = (jobId) => {
+    // The first poll and an interval tick can both see the job finish; fetch the result once
+    let finished = false;
+    const poll = async () => {
+      const completed = await pollProgress(jobId);
+      if (completed && !finished) {
+        finished = true;
+        // Wait a moment then fetch final result
+        setTimeout(async () => {
+          try {
+            // Fetch the download result to get tracks
+            const finalResponse = await fetch(`/api/download/result?jobId=${jobId}`);
+
+            if (finalResponse.ok) {
+              await completeDownload(await finalResponse.json());
+            } else if (finalResponse.status === 202) {
+              // Still processing, continue polling
+              return;
+            } else {
+              const errorData = await finalResponse.json().catch(() => ({ detail: "Failed to get result" }));
+              throw new Error(errorData.detail || "Failed to get download result");
+            }
+          } catch (err) {
+            setError(err.message || "Failed to get download result");
+            setLoading(false);
+          }
+        }, 1000);
+      }
+    };
+    progressIntervalRef.current = setInterval(poll, 1000); // Poll every second
+
+    // Also poll immediately
+    poll();
+  };
+
+  // Push updates over server-sent events; fall back to polling if the stream is unavailable
+  const watchProgress = (jobId) => {
+    if (typeof EventSource === "undefined") {
+      startPolling(jobId);
+      return;
+    }
+
+    const source = new EventSource(`/api/events?jobId=${jobId}`);
+    eventSourceRef.current = source;
+
+    source.addEventListener("progress", (event) => {
+      applyProgress(JSON.parse(event.data));
+    });
+
+    source.addEventListener("done", async (event) => {
+      source.close();
+      eventSourceRef.current = null;
+      const done = JSON.parse(event.data);
+      applyProgress(done.progress || {});
+
+      if (done.result) {
+        try {
+          await completeDownload(done.result);
+        } catch (err) {
+          setError(err.message || "Failed to get download result");
+          setLoading(false);
+        }
+        return;
+      }
+
+      showNotification("Download Failed", {
+        body: "There was an error downloading the playlist.",
+        tag: "download-error",
+      });
+      setError(done.error || "Download failed");
+      setLoading(false);
+    });
+
+    source.onerror = () => {
+      source.close();
+      eventSourceRef.current = null;
+      if (!progressIntervalRef.current) {
+        startPolling(jobId);
+      }
+    };
+  };
+
   const onSubmit = async (e) => {
     e.preventDefault();
     if (!detailsVisible || metadataLoading) return;
     setLoading(true);
     setError("");
-    setProgress({ current: 0, total: 0, status: "starting", currentTitle: "" });
+    setProgress({ current: 0, total: 0, status: "starting", currentTitle: "", queuePosition: null, speed: null, etaSeconds: null });
 
     try {
       // Start download (this will return immediately with job_id)
@@ -189,6 +333,10 @@ export default function Home() {
             artist: albumArtist,
             year: year,
           },
+          // Lets the server skip listing the playlist again; it is ignored if the URL was edited since
+          info_token: infoToken || undefined,
+          // Keeps the prefilled cover on the server until the album is finalized
+          cover_id: coverId || undefined,
         }),
       });
 
@@ -200,57 +348,7 @@ export default function Home() {
       const data = await response.json();
       const jobId = data.job_id;
 
-      // Poll for progress
-      progressIntervalRef.current = setInterval(async () => {
-        const completed = await pollProgress(jobId);
-        if (completed) {
-          // Wait a moment then fetch final result
-          setTimeout(async () => {
-            try {
-              // Fetch the download result to get tracks
-              const finalResponse = await fetch(`/api/download/result?jobId=${jobId}`);
-              
-              if (finalResponse.ok) {
-                const finalData = await finalResponse.json();
-                const coverBase64 = cover ? await toBase64(cover) : autoCoverBase64 || null;
-
-                sessionStorage.setItem(
-                  "p2a-manifest",
-                  JSON.stringify({
-                    ...finalData,
-                    album: {
-                      title: albumTitle,
-                      artist: albumArtist,
-                      year: year,
-                    },
-                    coverBase64,
-                  })
-                );
-
-                // Show notification
-                showNotification("Playlist2Album Complete!", {
-                  body: `Successfully downloaded ${finalData.tracks?.length || 0} tracks. Ready to proceed to ordering.`,
-                  tag: "download-complete",
-                });
-
-                router.push("/order");
-              } else if (finalResponse.status === 202) {
-                // Still processing, continue polling
-                return;
-              } else {
-                const errorData = await finalResponse.json().catch(() => ({ detail: "Failed to get result" }));
-                throw new Error(errorData.detail || "Failed to get download result");
-              }
-            } catch (err) {
-              setError(err.message || "Failed to get download result");
-              setLoading(false);
-            }
-          }, 1000);
-        }
-      }, 1000); // Poll every second
-
-      // Also poll immediately
-      await pollProgress(jobId);
+      watchProgress(jobId);
     } catch (err) {
       setError(err.message || "Failed to download playlist");
       setLoading(false);
@@ -258,6 +356,10 @@ export default function Home() {
         clearInterval(progressIntervalRef.current);
         progressIntervalRef.current = null;
       }
+      if (eventSourceRef.current) {
+        eventSourceRef.current.close();
+        eventSourceRef.current = null;
+      }
     }
   };
 
@@ -281,12 +383,15 @@ export default function Home() {
     }
   };
 
-  // Cleanup interval on unmount
+  // Cleanup interval and event stream on unmount
   useEffect(() => {
     return () => {
       if (progressIntervalRef.current) {
         clearInterval(progressIntervalRef.current);
       }
+      if (eventSourceRef.current) {
+        eventSourceRef.current.close();
+      }
     };
   }, []);
 
@@ -317,36 +422,37 @@ export default function Home() {
   const handleFileChange = async (e) => {
     const file = e.target.files?.[0];
     if (file) {
+      setCoverId("");
+      let coverFile = file;
       try {
-        setAutoCoverBase64("");
         // Crop to square
-        const croppedFile = await cropToSquare(file);
-        setCover(croppedFile);
-        setCoverFileName(file.name);
-        
-        // Create preview URL from cropped image
-        const reader = new FileReader();
-        reader.onloadend = () => {
-          setCoverPreview(reader.result);
-        };
-        reader.readAsDataURL(croppedFile);
+        coverFile = await cropToSquare(file);
       } catch (err) {
         console.error("Error cropping image:", err);
         setError("Failed to process image. Please try again.");
         // Fallback to original file
-        setCover(file);
-        setCoverFileName(file.name);
-        const reader = new FileReader();
-        reader.onloadend = () => {
-          setCoverPreview(reader.result);
-        };
-        reader.readAsDataURL(file);
+      }
+      setCoverFileName(file.name);
+
+      // Create preview URL from the image being uploaded
+      const reader = new FileReader();
+      reader.onloadend = () => {
+        setCoverPreview(reader.result);
+      };
+      reader.readAsDataURL(coverFile);
+
+      setCoverUploading(true);
+      try {
+        setCoverId(await uploadCover(coverFile));
+      } catch (err) {
+        setError(err.message || "Cover upload failed");
+      } finally {
+        setCoverUploading(false);
       }
     } else {
-      setCover(null);
+      setCoverId("");
       setCoverFileName("");
       setCoverPreview("");
-      setAutoCoverBase64("");
     }
   };
 
@@ -494,14 +600,16 @@ export default function Home() {
           <button
             type="submit"
             className={styles.button}
-            disabled={loading || metadataLoading || !playlistUrl || !detailsVisible}
+            disabled={loading || metadataLoading || coverUploading || !playlistUrl || !detailsVisible}
           >
             {loading ? "Downloading..." : "Fetch & Convert"}
           </button>
 
           {loading && (
             <div className={styles.loading}>
-              {progress.total > 0 ? (
+              {progress.status === "waiting_for_space" ? (
+                <div>Waiting for free disk space on the server...</div>
+              ) : progress.total > 0 ? (
                 <>
                   <div className={styles.progressText}>
                     Downloading {progress.current} of {progress.total} videos...
@@ -511,6 +619,11 @@ export default function Home() {
                       Current: {progress.currentTitle}
                     </div>
                   )}
+                  {(progress.speed || progress.etaSeconds !== null) && (
+                    <div className={styles.transferStats}>
+                      {[formatSpeed(progress.speed), formatEta(progress.etaSeconds)].filter(Boolean).join(" · ")}
+                    </div>
+                  )}
                   <div className={styles.progressBar}>
                     <div
                       className={styles.progressFill}
@@ -520,6 +633,11 @@ export default function Home() {
                     />
                   </div>
                 </>
+              ) : progress.status === "queued" ? (
+                <div>
+                  Waiting in queue
+                  {progress.queuePosition ? ` (position ${progress.queuePosition})` : ""}...
+                </div>
               ) : (
                 <div>Starting download... This may take a while.</div>
               )}